@@ -1,11 +1,27 @@
 import os
 import json
+import time
+import zlib
+import gzip
+import base64
 import datetime
 import random
-from flask import Flask, request, jsonify
+from concurrent.futures import ThreadPoolExecutor
+import click
+from flask import Flask, request, jsonify, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
 import requests
+from owm_client import owm_get
+from forecast_cache import SharedTTLCache, next_forecast_block_boundary
+from singleflight import SingleFlight
+from write_behind import IdBlockAllocator, WriteBehindQueue
+from db_engine import engine_options, tune_engine
+import migrations
+import rollups
+from rain_model import load_rain_model, features_from_block
+from micro_batcher import MicroBatcher
+from payload_codec import compress_payload, decompress_payload, payload_digest, train_dictionary, save_dictionary
 
 # --- Configuration ---
 WEATHER_API_KEY = "apikey" 
@@ -15,13 +31,73 @@ if WEATHER_API_KEY == "apikey" and not os.environ.get('DATABASE_URL'):
     print("WARNING: Please replace 'YOUR_API_KEY_GOES_HERE' in app.py")
     print("="*50)
 
-WEATHER_API_URL = "https://api.openweathermap.org/data/2.5/forecast"
+# OWM_BASE_URL can point at a local stand-in server for offline benchmarks
+OWM_BASE_URL = os.environ.get('OWM_BASE_URL', "https://api.openweathermap.org/data/2.5")
+WEATHER_API_URL = f"{OWM_BASE_URL}/forecast"
 # --- NEW: URL to find cities by coordinates ---
-NEARBY_API_URL = "https://api.openweathermap.org/data/2.5/find"
+NEARBY_API_URL = f"{OWM_BASE_URL}/find"
+
+# --- Location scouting: how many nearby-city forecasts to fetch at once ---
+SCOUT_MAX_WORKERS = int(os.environ.get('SCOUT_MAX_WORKERS', '5'))
+
+# --- Forecast cache: one SQLite file shared by every gunicorn worker ---
+FORECAST_CACHE_ENABLED = os.environ.get('FORECAST_CACHE_ENABLED', '1') == '1'
+FORECAST_CACHE_PATH = os.environ.get(
+    'FORECAST_CACHE_PATH',
+    os.path.join(os.path.abspath(os.path.dirname(__file__)), 'forecast_cache.db'))
+FORECAST_CACHE_MAX_ENTRIES = int(os.environ.get('FORECAST_CACHE_MAX_ENTRIES', '1000'))
+
+# --- Nearby-cities cache: neighbour lists per lat/lon tile, kept for a week ---
+NEARBY_TILE_DEGREES = float(os.environ.get('NEARBY_TILE_DEGREES', '0.1'))
+NEARBY_CACHE_TTL_SECONDS = int(os.environ.get('NEARBY_CACHE_TTL_SECONDS', str(7 * 24 * 60 * 60)))
+
+# --- Fast scouting: rank neighbours from the current weather in the /find payload ---
+SCOUT_MODES = ('full', 'fast')
+NEARBY_WEATHER_TTL_SECONDS = int(os.environ.get('NEARBY_WEATHER_TTL_SECONDS', '600'))
+
+# --- Batch predictions: most {city, activity} items accepted in one call ---
+BATCH_MAX_ITEMS = int(os.environ.get('BATCH_MAX_ITEMS', '50'))
+
+# --- Store new live_weather payloads compressed (see payload_codec.py) ---
+PAYLOAD_COMPRESSION = os.environ.get('PAYLOAD_COMPRESSION', '1') == '1'
+# Store each distinct payload once in weather_payload (always compressed) and
+# point predictions at it; same-city requests in one forecast window share it
+PAYLOAD_DEDUP = os.environ.get('PAYLOAD_DEDUP', '1') == '1'
+# prune-predictions only removes unreferenced payloads that no save has
+# written for this long, so it can't race a /predict that is about to commit
+PAYLOAD_ORPHAN_GRACE_SECONDS = int(os.environ.get('PAYLOAD_ORPHAN_GRACE_SECONDS', '3600'))
+
+# --- /all pagination: rows per page ---
+ALL_DEFAULT_LIMIT = int(os.environ.get('ALL_DEFAULT_LIMIT', '100'))
+ALL_MAX_LIMIT = int(os.environ.get('ALL_MAX_LIMIT', '1000'))
+
+# --- /export streaming: rows fetched per DB round-trip and per output chunk ---
+EXPORT_CHUNK_ROWS = int(os.environ.get('EXPORT_CHUNK_ROWS', '1000'))
+
+# --- Plan A: the trained rain model (rain_model.py); off falls back to OWM's pop ---
+RAIN_MODEL_ENABLED = os.environ.get('RAIN_MODEL_ENABLED', '1') == '1'
+# Batch model calls from concurrent requests (micro_batcher.py); only useful with threaded workers
+INFERENCE_BATCHING_ENABLED = os.environ.get('INFERENCE_BATCHING_ENABLED', '0') == '1'
+INFERENCE_BATCH_MAX_SIZE = int(os.environ.get('INFERENCE_BATCH_MAX_SIZE', '64'))
+INFERENCE_BATCH_MAX_WAIT_MS = float(os.environ.get('INFERENCE_BATCH_MAX_WAIT_MS', '2'))
+
+# --- Rollups & retention: hours are aggregated once they are this old; raw rows kept this long ---
+ROLLUP_LAG_SECONDS = int(os.environ.get('ROLLUP_LAG_SECONDS', '300'))
+PREDICTION_RETENTION_DAYS = int(os.environ.get('PREDICTION_RETENTION_DAYS', '90'))
+
+# --- Single-flight: concurrent requests for one city share a single fetch ---
+SINGLEFLIGHT_LOCK_DIR = os.environ.get('SINGLEFLIGHT_LOCK_DIR', FORECAST_CACHE_PATH + '.locks')
+SINGLEFLIGHT_WAIT_SECONDS = float(os.environ.get('SINGLEFLIGHT_WAIT_SECONDS', '15'))
+
+# --- Write-behind: queue new predictions and commit them in background batches ---
+WRITE_BEHIND_ENABLED = os.environ.get('WRITE_BEHIND_ENABLED', '0') == '1'
+WRITE_BEHIND_MAX_QUEUE = int(os.environ.get('WRITE_BEHIND_MAX_QUEUE', '1000'))
+WRITE_BEHIND_BATCH_SIZE = int(os.environ.get('WRITE_BEHIND_BATCH_SIZE', '100'))
+WRITE_BEHIND_FLUSH_INTERVAL = float(os.environ.get('WRITE_BEHIND_FLUSH_INTERVAL', '0.05'))
 
 # --- App & Database Setup ---
 app = Flask(__name__)
-CORS(app) 
+CORS(app, expose_headers=['X-Next-Cursor']) 
 
 # --- DATABASE CONFIGURATION ---
 prod_db_url = os.environ.get('DATABASE_URL')
@@ -40,13 +116,52 @@ else:
     print(f"Connecting to local SQLite database at {local_db_path}...")
 
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Connection pooling, plus WAL and the other SQLite pragmas (see db_engine.py)
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
 db = SQLAlchemy(app)
+with app.app_context():
+    tune_engine(db.engine)
 
 # --- Database Model ---
+# Field names clients can ask for with ?fields=, in response order
+PREDICTION_FIELDS = (
+    'id', 'city', 'live_weather', 'ml_prediction_text', 'api_forecast_temp', 'api_forecast_amount_mm',
+    'intensity_tag', 'impact_index', 'api_feels_like', 'api_humidity', 'api_wind_speed', 'api_pop',
+    'timestamp', 'activity_recommendation'
+)
+# Extra keys /predict adds next to the stored fields
+PREDICT_EXTRA_FIELDS = ('location_ranking', 'scout_mode', 'activity_matrix')
+
+class WeatherPayload(db.Model):
+    """One distinct OWM forecast payload, stored once and keyed by its SHA-256."""
+    __tablename__ = 'weather_payload'
+    hash = db.Column(db.String(64), primary_key=True)
+    data_z = db.Column(db.LargeBinary, nullable=False)
+    raw_size = db.Column(db.Integer, nullable=False)  # Uncompressed bytes, for the storage report
+    created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    # Bumped by every save that points a prediction at this payload
+    last_used_at = db.Column(db.DateTime, nullable=True)
+
+    def text(self):
+        # Rows on one page often share a payload object: decompress it once
+        if getattr(self, '_text', None) is None:
+            self._text = decompress_payload(self.data_z)
+        return self._text
+
+
 class Prediction(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     city = db.Column(db.Text, nullable=False)
-    live_weather = db.Column(db.Text, nullable=False) # Stores the full JSON response as a string
+    # Stores the full JSON response. New rows point at a shared weather_payload
+    # row through payload_hash (and leave live_weather ''). Older rows hold it
+    # inline: compressed in live_weather_z, or as a plain string in
+    # live_weather. All three are deferred: only loaded when a query asks for
+    # the payload, so light queries never read the large columns.
+    live_weather = db.deferred(db.Column(db.Text, nullable=False), group='live_weather')
+    live_weather_z = db.deferred(db.Column(db.LargeBinary, nullable=True), group='live_weather')
+    payload_hash = db.deferred(db.Column(db.String(64), nullable=True), group='live_weather')
+    payload = db.relationship(
+        WeatherPayload, primaryjoin='foreign(Prediction.payload_hash) == WeatherPayload.hash', viewonly=True)
     
     # "Plan A" - Our own ML model's prediction
     ml_prediction_text = db.Column(db.Text, nullable=True)
@@ -67,83 +182,239 @@ class Prediction(db.Model):
     # --- NEW: Added for Activity Feature ---
     activity_recommendation = db.Column(db.Text, nullable=True)
 
-    def to_dict(self):
-        # Safely parse the live_weather JSON string back into an object
-        live_weather_data = {}
-        try:
-            live_weather_data = json.loads(self.live_weather)
-        except json.JSONDecodeError:
+    def scalar_fields(self, fields=None):
+        """Every field except live_weather (or just the ones in fields), ready for JSON."""
+        data = {}
+        for name in fields or PREDICTION_FIELDS:
+            if name == 'live_weather':
+                continue
+            value = getattr(self, name)
+            data[name] = value.isoformat() if name == 'timestamp' else value
+        return data
+
+    def store_live_weather(self, payload_json):
+        """
+        Stores a JSON payload string: by reference to weather_payload with
+        PAYLOAD_DEDUP (save_predictions() writes the payload row), otherwise
+        inline, compressed unless PAYLOAD_COMPRESSION is off.
+        """
+        if PAYLOAD_DEDUP:
+            self.live_weather = ''
+            self.live_weather_z = None
+            self.payload_hash = payload_digest(payload_json)
+            self.pending_payload = payload_json
+        elif PAYLOAD_COMPRESSION:
+            self.live_weather = ''
+            self.live_weather_z = compress_payload(payload_json)
+        else:
+            self.live_weather = payload_json
+            self.live_weather_z = None
+
+    def live_weather_text(self):
+        """The stored payload as JSON text, decompressed if needed."""
+        if self.payload_hash is not None:
+            pending = getattr(self, 'pending_payload', None)
+            if pending is not None:
+                return pending
+            # A dangling hash (its weather_payload row was pruned) reads as unparseable
+            return self.payload.text() if self.payload is not None else ''
+        if self.live_weather_z is not None:
+            return decompress_payload(self.live_weather_z)
+        return self.live_weather
+
+    def to_dict(self, live_weather_data=None):
+        """
+        The row as a dict, with live_weather as a JSON object.
+        Pass live_weather_data when the caller already has the parsed payload
+        (e.g. right after /predict fetched it) to skip parsing it back.
+        """
+        if live_weather_data is None:
+            # Safely parse the live_weather JSON string back into an object
+            try:
+                live_weather_data = json.loads(self.live_weather_text())
+            except json.JSONDecodeError:
+                print(f"Error decoding JSON for prediction ID {self.id}")
+                live_weather_data = {"error": "Could not parse stored weather data."}
+
+        data = self.scalar_fields()
+        data["live_weather"] = live_weather_data # Send as a JSON object
+        return data
+
+    def to_json(self, fields=None):
+        """
+        Same content as to_dict() (or just the given fields), serialised to a
+        JSON string. Payloads the app stored itself (compressed or in
+        weather_payload) are already JSON, so they are spliced in as-is
+        instead of being parsed and re-encoded on every read; old plain-text
+        rows are parsed once to check them.
+        """
+        if fields is not None and 'live_weather' not in fields:
+            return json.dumps(self.scalar_fields(fields))
+        live_weather_json = self.live_weather_text()
+        if self.payload_hash is not None or self.live_weather_z is not None:
+            valid = live_weather_json.startswith('{') and live_weather_json.endswith('}')
+        else:
+            valid = is_json_object_text(live_weather_json)
+        if not valid:
             print(f"Error decoding JSON for prediction ID {self.id}")
-            live_weather_data = {"error": "Could not parse stored weather data."}
-
-        return {
-            "id": self.id,
-            "city": self.city,
-            "live_weather": live_weather_data, # Send as a JSON object
-            "ml_prediction_text": self.ml_prediction_text,
-            "api_forecast_temp": self.api_forecast_temp,
-            "api_forecast_amount_mm": self.api_forecast_amount_mm,
-            "intensity_tag": self.intensity_tag,
-            "impact_index": self.impact_index,
-            "api_feels_like": self.api_feels_like,
-            "api_humidity": self.api_humidity,
-            "api_wind_speed": self.api_wind_speed,
-            "api_pop": self.api_pop,
-            "timestamp": self.timestamp.isoformat(),
-            "activity_recommendation": self.activity_recommendation 
-        }
+            live_weather_json = '{"error": "Could not parse stored weather data."}'
+        scalar_json = json.dumps(self.scalar_fields(fields))
+        separator = ', ' if scalar_json != '{}' else ''
+        return scalar_json[:-1] + separator + '"live_weather": ' + live_weather_json + '}'
+
+
+def is_json_object_text(text):
+    """True if text parses as a JSON object, so it can be spliced into a response as-is."""
+    try:
+        return isinstance(json.loads(text), dict)
+    except (TypeError, ValueError):
+        return False
+
+
+def json_array_response(json_items, status=200, headers=None):
+    """Builds a JSON list response from already-serialised items."""
+    body = '[' + ', '.join(json_items) + ']'
+    return app.response_class(body, status=status, headers=headers, mimetype='application/json')
+
+# --- Indexes (created on existing databases by migrations.py) ---
+db.Index('ix_prediction_timestamp_id', Prediction.timestamp, Prediction.id)
+db.Index('ix_prediction_city_timestamp', Prediction.city, Prediction.timestamp)
+db.Index('ix_prediction_city_lower_timestamp', db.func.lower(Prediction.city), Prediction.timestamp, Prediction.id)
+db.Index('ix_prediction_payload_hash', Prediction.payload_hash)
 
 # --- Helper Function for Location Scoring ---
 
+ACTIVITIES = ('run', 'hang_laundry', 'picnic', 'bike_commute')
+# Pass activity='all' to score every activity at once
+ALL_ACTIVITIES = 'all'
+
+
+def read_block_conditions(forecast_block):
+    """
+    Pulls the fields the activity rules need out of a forecast block.
+    Returns a tuple: (rain_mm, feels_like, humidity, wind_speed, pop)
+    """
+    return (
+        forecast_block.get('rain', {}).get('3h', 0),
+        forecast_block['main']['feels_like'],
+        forecast_block['main']['humidity'],
+        forecast_block['wind']['speed'],
+        forecast_block.get('pop', 0)
+    )
+
+
+def score_activity(activity, conditions):
+    """Applies one activity's rules to read_block_conditions() output."""
+    block_rain_mm, block_feels_like, block_humidity, block_wind, block_pop = conditions
+
+    if activity == 'run':
+        if block_rain_mm > 0.5: return ("Bad for a run (Rain)", 0)
+        if block_feels_like > 32: return ("Challenging (Heat)", 1)
+        if block_feels_like < 5: return ("Challenging (Cold)", 1)
+        return ("It's a great day for a run!", 2)
+    
+    elif activity == 'hang_laundry':
+        if block_rain_mm > 0: return ("Don't hang laundry (Rain)", 0)
+        if block_humidity > 85: return ("Not ideal (High humidity)", 1)
+        if block_wind > 30: return ("Risky (High winds)", 1)
+        return ("Perfect day to hang laundry!", 2)
+
+    elif activity == 'picnic':
+        if block_rain_mm > 0.1: return ("Bad for a picnic (Rain)", 0)
+        if block_wind > 25: return ("Not ideal (Too windy)", 1)
+        if block_feels_like > 35 or block_feels_like < 10: return ("Uncomfortable (Temp)", 1)
+        return ("Looks like a great day!", 2)
+
+    elif activity == 'bike_commute':
+        if block_rain_mm > 1: return ("Bad for biking (Heavy rain)", 0)
+        if block_wind > 35: return ("Difficult (Strong winds)", 1)
+        if block_pop > 0.5: return ("Risky (High chance of rain)", 1)
+        return ("Looks clear for your commute!", 2)
+    
+    return ("No activity selected.", 0)
+
+
 def get_recommendation_for_block(activity, forecast_block):
     """
     Analyzes a single 3-hour forecast block and returns a recommendation.
     Returns a tuple: (recommendation_string, score)
     Score: 2 for "Good", 1 for "OK/Challenging", 0 for "Bad".
+    With activity 'all', returns the advice for the best-scoring activity.
     """
     try:
-        block_rain_mm = forecast_block.get('rain', {}).get('3h', 0)
-        block_feels_like = forecast_block['main']['feels_like']
-        block_humidity = forecast_block['main']['humidity']
-        block_wind = forecast_block['wind']['speed']
-        block_pop = forecast_block.get('pop', 0)
-
-        if activity == 'run':
-            if block_rain_mm > 0.5: return ("Bad for a run (Rain)", 0)
-            if block_feels_like > 32: return ("Challenging (Heat)", 1)
-            if block_feels_like < 5: return ("Challenging (Cold)", 1)
-            return ("It's a great day for a run!", 2)
-        
-        elif activity == 'hang_laundry':
-            if block_rain_mm > 0: return ("Don't hang laundry (Rain)", 0)
-            if block_humidity > 85: return ("Not ideal (High humidity)", 1)
-            if block_wind > 30: return ("Risky (High winds)", 1)
-            return ("Perfect day to hang laundry!", 2)
-
-        elif activity == 'picnic':
-            if block_rain_mm > 0.1: return ("Bad for a picnic (Rain)", 0)
-            if block_wind > 25: return ("Not ideal (Too windy)", 1)
-            if block_feels_like > 35 or block_feels_like < 10: return ("Uncomfortable (Temp)", 1)
-            return ("Looks like a great day!", 2)
-
-        elif activity == 'bike_commute':
-            if block_rain_mm > 1: return ("Bad for biking (Heavy rain)", 0)
-            if block_wind > 35: return ("Difficult (Strong winds)", 1)
-            if block_pop > 0.5: return ("Risky (High chance of rain)", 1)
-            return ("Looks clear for your commute!", 2)
-        
-        return ("No activity selected.", 0)
+        if activity == ALL_ACTIVITIES:
+            recommendations = get_recommendations_for_block(forecast_block)
+            best = max(range(len(ACTIVITIES)), key=lambda i: recommendations[i][1])
+            recommendation, score = recommendations[best]
+            return (f"Best for {ACTIVITIES[best]}: {recommendation}", score)
+        return score_activity(activity, read_block_conditions(forecast_block))
 
     except Exception as e:
         print(f"Error in get_recommendation_for_block: {e}")
         return (f"Error analyzing", 0)
 
 
+def get_recommendations_for_block(forecast_block, activities=ACTIVITIES):
+    """
+    Scores every activity against one forecast block, reading the block once.
+    Returns a list of (recommendation_string, score) in activities order.
+    """
+    try:
+        conditions = read_block_conditions(forecast_block)
+    except Exception as e:
+        print(f"Error in get_recommendations_for_block: {e}")
+        return [("Error analyzing", 0)] * len(activities)
+    return [score_activity(activity, conditions) for activity in activities]
+
+
+forecast_cache = None
+if FORECAST_CACHE_ENABLED:
+    forecast_cache = SharedTTLCache(FORECAST_CACHE_PATH, 'forecast', FORECAST_CACHE_MAX_ENTRIES)
+    # Same file, separate namespace: the cities around a point hardly ever change
+    nearby_cache = SharedTTLCache(FORECAST_CACHE_PATH, 'nearby', FORECAST_CACHE_MAX_ENTRIES)
+    # Current conditions from /find (fast scouting) go stale much sooner
+    nearby_weather_cache = SharedTTLCache(FORECAST_CACHE_PATH, 'nearby_weather', FORECAST_CACHE_MAX_ENTRIES)
+else:
+    nearby_cache = None
+    nearby_weather_cache = None
+
+# Cross-worker coalescing relies on the shared cache, so it is only switched on with it
+forecast_flights = SingleFlight(
+    lock_dir=SINGLEFLIGHT_LOCK_DIR if forecast_cache is not None else None,
+    wait_seconds=SINGLEFLIGHT_WAIT_SECONDS)
+
+
+def normalize_city(city_name):
+    """Cache key for a city name: trimmed, single-spaced, lower-case."""
+    return ' '.join(city_name.split()).lower()
+
+
 def get_weather_for_city(city_name):
     """
     Fetches 3-hour (1 block) forecast for a single city.
+    Served from the shared forecast cache until the current block ends, and
+    concurrent misses for the same city wait on one upstream fetch.
     Returns the JSON data or None if an error occurs.
     """
+    cache_key = normalize_city(city_name)
+    if forecast_cache is not None:
+        cached = forecast_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    return forecast_flights.do(cache_key, lambda: fetch_weather_for_city(city_name, cache_key))
+
+
+def fetch_weather_for_city(city_name, cache_key):
+    """
+    Single-flight leader for get_weather_for_city(): calls the API and fills the cache.
+    """
+    if forecast_cache is not None:
+        # Another worker may have fetched this city while we waited for the lock
+        cached = forecast_cache.get(cache_key, count_lookup=False)
+        if cached is not None:
+            return cached
+
     params = {
         'q': city_name,
         'appid': WEATHER_API_KEY,
@@ -151,9 +422,12 @@ def get_weather_for_city(city_name):
         'cnt': 1 # --- CHANGED: Back to 1 block ---
     }
     try:
-        response = requests.get(WEATHER_API_URL, params=params)
+        response = owm_get(WEATHER_API_URL, params)
         if response.status_code == 200:
-            return response.json()
+            weather_data = response.json()
+            if forecast_cache is not None:
+                forecast_cache.set(cache_key, weather_data, next_forecast_block_boundary())
+            return weather_data
         else:
             print(f"Weather API error for {city_name}: {response.text}")
             return None
@@ -161,30 +435,125 @@ def get_weather_for_city(city_name):
         print(f"Network error for {city_name}: {e}")
         return None
 
-# --- API Routes ---
 
-@app.route('/predict', methods=['POST'])
-def predict():
-    data = request.get_json()
-    if not data or 'city' not in data:
-        return jsonify({"error": "Anchor city is required"}), 400
+def get_geo_tile(lat, lon):
+    """Cache key for the NEARBY_TILE_DEGREES-sized tile containing (lat, lon)."""
+    return f"{round(lat / NEARBY_TILE_DEGREES)}:{round(lon / NEARBY_TILE_DEGREES)}"
 
-    anchor_city = data['city']
-    activity = data.get('activity', 'none')
-    # --- REMOVED: No longer need to get compare_locations from user ---
-    # compare_locations_str = data.get('compare_locations', '')
-    
-    if not WEATHER_API_KEY or WEATHER_API_KEY == "YOUR_API_KEY_GOES_HERE":
-        return jsonify({"error": "Server configuration error: Weather API key is missing."}), 500
 
-    # --- Step 1: Get weather for the Anchor City FIRST ---
-    anchor_city_weather_data = get_weather_for_city(anchor_city)
-    
-    if not anchor_city_weather_data or 'list' not in anchor_city_weather_data or not anchor_city_weather_data['list']:
-         return jsonify({"error": f"Could not retrieve weather data for anchor city: {anchor_city}"}), 404
+def fetch_nearby_items(lat, lon):
+    """
+    Calls /find for the cities closest to (lat, lon), anchor included.
+    Returns the raw list of city items (each with current weather), or None.
+    Also refreshes the tile's neighbour-name cache.
+    """
+    nearby_params = {
+        'lat': lat,
+        'lon': lon,
+        'cnt': 6, # Get anchor city + 5 nearby
+        'appid': WEATHER_API_KEY,
+        'units': 'metric'
+    }
+    nearby_response = owm_get(NEARBY_API_URL, nearby_params)
+    if nearby_response.status_code != 200:
+        print(f"Error finding nearby cities: {nearby_response.text}")
+        return None
 
-    # --- Step 2: Auto-detect nearby cities ---
+    nearby_data = nearby_response.json()
+    if 'list' not in nearby_data:
+        return None
+    if nearby_cache is not None:
+        city_names = [item['name'] for item in nearby_data['list']]
+        nearby_cache.set(get_geo_tile(lat, lon), city_names, time.time() + NEARBY_CACHE_TTL_SECONDS)
+    return nearby_data['list']
+
+
+def get_nearby_city_names(lat, lon):
+    """
+    Returns the names of the cities closest to (lat, lon), anchor included.
+    Cached per geo tile, so every request for the same region after the first
+    skips the /find call. Returns None if the lookup fails.
+    """
+    if nearby_cache is not None:
+        cached = nearby_cache.get(get_geo_tile(lat, lon))
+        if cached is not None:
+            return cached
+
+    items = fetch_nearby_items(lat, lon)
+    if items is None:
+        return None
+    return [item['name'] for item in items]
+
+
+def get_nearby_current_weather(lat, lon):
+    """
+    Returns the /find items (name + current weather) for the cities closest
+    to (lat, lon). Cached per geo tile for NEARBY_WEATHER_TTL_SECONDS.
+    """
+    tile = get_geo_tile(lat, lon)
+    if nearby_weather_cache is not None:
+        cached = nearby_weather_cache.get(tile)
+        if cached is not None:
+            return cached
+
+    items = fetch_nearby_items(lat, lon)
+    if items is None:
+        return None
+    # Only keep what scoring needs
+    items = [{key: item.get(key) for key in ('name', 'main', 'wind', 'rain')} for item in items]
+    if nearby_weather_cache is not None:
+        nearby_weather_cache.set(tile, items, time.time() + NEARBY_WEATHER_TTL_SECONDS)
+    return items
+
+
+def block_from_current_weather(item):
+    """
+    Turns a /find city item into a get_recommendation_for_block()-compatible
+    forecast block. Current weather reports rain over the last 1h or 3h and
+    has no probability of precipitation, so pop is taken as 0.
+    """
+    rain = item.get('rain') or {}
+    return {
+        'main': item['main'],
+        'wind': item['wind'],
+        'rain': {'3h': rain.get('3h', rain.get('1h', 0))},
+        'pop': 0
+    }
+
+
+def fetch_missing_weather(weather_by_key, city_names):
+    """
+    Adds every city in city_names that weather_by_key doesn't have yet
+    (keyed by normalize_city) to it, fetching each one once and concurrently.
+    """
+    missing = {}
+    for city in city_names:
+        cache_key = normalize_city(city)
+        if cache_key not in weather_by_key and cache_key not in missing:
+            missing[cache_key] = city
+    fetched = fetch_weather_for_cities(list(missing.values()))
+    for cache_key, city in missing.items():
+        weather_by_key[cache_key] = fetched[city]
+
+
+def first_forecast_block(weather_data):
+    """Returns the first forecast block of a /forecast payload, or None if there isn't one."""
+    if not weather_data or 'list' not in weather_data or not weather_data['list']:
+        return None
+    return weather_data['list'][0]
+
+
+def find_cities_to_check(anchor_city, anchor_city_weather_data, scout_mode='full'):
+    """
+    Builds the scouting list: the anchor city first, then up to 5 neighbours
+    found from the anchor's coordinates. Any failure here is non-fatal and
+    just leaves the anchor city on its own.
+    Returns (all_cities_to_check, current_blocks). In 'fast' mode
+    current_blocks maps each neighbour to a block built from the /find
+    payload; in 'full' mode it is empty.
+    """
     all_cities_to_check = [anchor_city] # Start the list with our anchor
+    current_blocks = {}
     try:
         coord = anchor_city_weather_data.get('city', {}).get('coord', {})
         lat = coord.get('lat')
@@ -192,47 +561,36 @@ def predict():
 
         if lat and lon:
             print(f"Found coords for {anchor_city}: {lat}, {lon}. Finding nearby cities...")
-            nearby_params = {
-                'lat': lat,
-                'lon': lon,
-                'cnt': 6, # Get anchor city + 5 nearby
-                'appid': WEATHER_API_KEY,
-                'units': 'metric'
-            }
-            nearby_response = requests.get(NEARBY_API_URL, params=nearby_params)
-            if nearby_response.status_code == 200:
-                nearby_data = nearby_response.json()
-                if 'list' in nearby_data:
-                    for item in nearby_data['list']:
-                        city_name = item['name']
-                        # Add if not anchor city and not already in list
-                        if city_name.lower() != anchor_city.lower() and city_name not in all_cities_to_check:
-                            all_cities_to_check.append(city_name)
-                    print(f"Cities to scout: {all_cities_to_check}")
+            if scout_mode == 'fast':
+                items = get_nearby_current_weather(lat, lon) or []
             else:
-                print(f"Error finding nearby cities: {nearby_response.text}")
+                items = [{'name': name} for name in get_nearby_city_names(lat, lon) or []]
+            for item in items:
+                city_name = item['name']
+                # Add if not anchor city and not already in list
+                if city_name.lower() != anchor_city.lower() and city_name not in all_cities_to_check:
+                    all_cities_to_check.append(city_name)
+                    if scout_mode == 'fast':
+                        current_blocks[city_name] = block_from_current_weather(item)
+            print(f"Cities to scout: {all_cities_to_check}")
         else:
             print("Could not find coords in anchor city data.")
     except Exception as e:
         print(f"Error during nearby city search: {e}")
         # Non-fatal, we can continue with just the anchor city
+    return all_cities_to_check, current_blocks
 
 
-    # --- Location Scouting Logic ---
+def build_location_ranking(activity, cities, blocks_by_city):
+    """
+    Scores every city's forecast block for the activity, best first.
+    Cities are scored in the given order and the sort is stable, so ties
+    always come out in the same order.
+    """
     location_ranking = []
-    # --- MODIFIED: Use the anchor city data we already fetched ---
-    anchor_city_weather_data_for_loop = anchor_city_weather_data 
-    
-    for city in all_cities_to_check:
-        weather_data = None
-        if city.lower() == anchor_city.lower():
-            # Use the data we fetched in Step 1
-            weather_data = anchor_city_weather_data_for_loop
-        else:
-            # Fetch data for the *other* nearby cities
-            weather_data = get_weather_for_city(city)
-        
-        if not weather_data or 'list' not in weather_data or not weather_data['list']:
+    for city in cities:
+        forecast_block = blocks_by_city.get(city)
+        if forecast_block is None:
             location_ranking.append({
                 "city": city,
                 "score": 0,
@@ -241,15 +599,7 @@ def predict():
             })
             continue
 
-        # Save the anchor city's data for our main display
-        # Note: we must set this for the loop, but it's okay to overwrite
-        if city.lower() == anchor_city.lower():
-            anchor_city_weather_data = weather_data
-
-        # Score this location based on its *only* forecast block
-        forecast_block = weather_data['list'][0]
         recommendation, score = get_recommendation_for_block(activity, forecast_block)
-
         location_ranking.append({
             "city": city,
             "score": score,
@@ -259,12 +609,114 @@ def predict():
 
     # Sort the ranking: best score first
     location_ranking.sort(key=lambda x: x['score'], reverse=True)
+    return location_ranking
+
+
+def build_activity_matrix(cities, blocks_by_city):
+    """
+    Scores every activity for every city in one pass over the blocks.
+    Returns a city x activity matrix: rows follow cities, columns follow
+    ACTIVITIES, and a city without data gets a row of None scores.
+    """
+    scores = []
+    recommendations = []
+    for city in cities:
+        forecast_block = blocks_by_city.get(city)
+        if forecast_block is None:
+            scores.append([None] * len(ACTIVITIES))
+            recommendations.append(["No data found"] * len(ACTIVITIES))
+            continue
+        city_recommendations = get_recommendations_for_block(forecast_block)
+        scores.append([score for _, score in city_recommendations])
+        recommendations.append([recommendation for recommendation, _ in city_recommendations])
+
+    return {
+        "activities": list(ACTIVITIES),
+        "cities": list(cities),
+        "scores": scores,
+        "recommendations": recommendations
+    }
+
+
+def score_locations(activity, cities, blocks_by_city):
+    """
+    Returns (location_ranking, activity_matrix). The matrix is only built for
+    activity 'all', in which case each city is ranked by its best activity.
+    """
+    if activity != ALL_ACTIVITIES:
+        return build_location_ranking(activity, cities, blocks_by_city), None
+
+    activity_matrix = build_activity_matrix(cities, blocks_by_city)
+    location_ranking = []
+    for city, scores, recommendations in zip(cities, activity_matrix['scores'], activity_matrix['recommendations']):
+        if scores[0] is None:
+            location_ranking.append({
+                "city": city,
+                "score": 0,
+                "recommendation": "No data found",
+                "status": "No data found"
+            })
+            continue
+        best = max(range(len(ACTIVITIES)), key=lambda i: scores[i])
+        location_ranking.append({
+            "city": city,
+            "score": scores[best],
+            "recommendation": f"Best for {ACTIVITIES[best]}: {recommendations[best]}",
+            "status": "Analyzed"
+        })
+
+    location_ranking.sort(key=lambda x: x['score'], reverse=True)
+    return location_ranking, activity_matrix
+
+
+_scout_executor = None
+_scout_executor_pid = None
+
+def get_scout_executor():
+    """
+    Returns this process's thread pool for nearby-city fetches.
+    Created lazily (and re-created after a fork) so every gunicorn worker
+    gets its own live threads instead of inheriting dead ones from the master.
+    """
+    global _scout_executor, _scout_executor_pid
+    if _scout_executor is None or _scout_executor_pid != os.getpid():
+        _scout_executor = ThreadPoolExecutor(max_workers=SCOUT_MAX_WORKERS, thread_name_prefix='scout')
+        _scout_executor_pid = os.getpid()
+    return _scout_executor
+
+
+def fetch_weather_for_cities(city_names):
+    """
+    Fetches forecasts for several cities concurrently.
+    Returns a dict of {city_name: JSON data or None}, built in input order.
+    """
+    if not city_names:
+        return {}
+    results = get_scout_executor().map(get_weather_for_city, city_names)
+    return dict(zip(city_names, results))
+
+# Loaded once at import. gunicorn_config.py preloads the app in the master, so
+# the forked workers share these pages instead of each loading its own copy.
+rain_model = load_rain_model() if RAIN_MODEL_ENABLED else None
 
-    # --- Now, process the ANCHOR CITY data for display and DB saving ---
-    # --- We already have this data from Step 1, no need to check for errors ---
-    # if not anchor_city_weather_data:
-    #    ...
+rain_batcher = None
+if rain_model is not None and INFERENCE_BATCHING_ENABLED:
+    rain_batcher = MicroBatcher(rain_model.probabilities_from_features,
+                                max_batch=INFERENCE_BATCH_MAX_SIZE, max_wait_ms=INFERENCE_BATCH_MAX_WAIT_MS)
 
+
+def predict_rain_probability(forecast_block):
+    """The rain model's P(rain) for one forecast block, batched with concurrent callers if enabled."""
+    if rain_batcher is not None:
+        return float(rain_batcher.submit(features_from_block(forecast_block)))
+    return float(rain_model.rain_probabilities([forecast_block])[0])
+
+def build_prediction(anchor_city, activity, anchor_city_weather_data, rain_probability=None):
+    """
+    Turns the anchor city's forecast into a new (unsaved) Prediction row:
+    the "Plan A" text, the "Plan B" impact tags and the activity advice.
+    Pass rain_probability when the caller already ran the model (e.g. /predict/batch).
+    """
     # Get data from the *first* (and only) forecast block
     first_forecast = anchor_city_weather_data['list'][0]
     rain_mm = first_forecast.get('rain', {}).get('3h', 0)
@@ -273,8 +725,13 @@ def predict():
     api_humidity = first_forecast['main']['humidity']
     api_wind_speed = first_forecast['wind']['speed']
 
-    # "Plan A" (Mock ML)
-    pop_percentage = int(api_pop * 100)
+    # "Plan A" (our model, or OWM's pop if it couldn't be loaded)
+    if rain_probability is not None:
+        pop_percentage = int(rain_probability * 100)
+    elif rain_model is not None:
+        pop_percentage = int(predict_rain_probability(first_forecast) * 100)
+    else:
+        pop_percentage = int(api_pop * 100)
     if pop_percentage > 50: ml_text = f"Yes, it will likely rain. Our model shows a {pop_percentage}% probability."
     elif pop_percentage > 10: ml_text = f"A slight chance of rain. Our model shows a {pop_percentage}% probability."
     else: ml_text = f"No, it will likely stay dry. Our model shows only a {pop_percentage}% probability."
@@ -288,29 +745,309 @@ def predict():
     # Get first-block recommendation for *anchor city*
     first_block_recommendation, _ = get_recommendation_for_block(activity, first_forecast)
 
+    new_prediction = Prediction(
+        city=anchor_city,
+        ml_prediction_text=ml_text,
+        api_forecast_temp=first_forecast['main']['temp'],
+        api_forecast_amount_mm=rain_mm,
+        intensity_tag=intensity,
+        impact_index=impact,
+        api_feels_like=api_feels_like,
+        api_humidity=api_humidity,
+        api_wind_speed=api_wind_speed,
+        api_pop=api_pop,
+        activity_recommendation=first_block_recommendation
+    )
+    # Store full JSON, compactly
+    new_prediction.store_live_weather(json.dumps(anchor_city_weather_data, separators=(',', ':')))
+    return new_prediction
+
+# --- Saving Predictions ---
+
+def prediction_row(prediction):
+    """Column values of an unsaved Prediction, for a bulk INSERT."""
+    return {column.key: getattr(prediction, column.key) for column in Prediction.__table__.columns}
+
+
+def weather_payload_rows(predictions):
+    """
+    weather_payload rows for the predictions' payloads, one per hash.
+    Always sent, even if the payload is probably stored already: a
+    prune-predictions run in another process may have deleted it, and
+    insert_payload_rows() skips the ones that do exist.
+    """
+    rows = {}
+    now = datetime.datetime.utcnow()
+    for prediction in predictions:
+        payload_json = getattr(prediction, 'pending_payload', None)
+        payload_hash = prediction.payload_hash
+        if payload_json is None or payload_hash in rows:
+            continue
+        rows[payload_hash] = {
+            "hash": payload_hash,
+            "data_z": compress_payload(payload_json),
+            "raw_size": len(payload_json.encode('utf-8')),
+            "created_at": now,
+            "last_used_at": now,
+        }
+    return list(rows.values())
+
+
+def insert_payload_rows(rows):
+    """
+    Inserts weather_payload rows on the current session. A hash that already
+    exists only gets its last_used_at bumped: that write also locks the row
+    until the predictions pointing at it commit, so a concurrent
+    prune-predictions can't delete it in between.
+    """
+    if not rows:
+        return
+    if db.engine.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    statement = dialect_insert(WeatherPayload.__table__)
+    statement = statement.on_conflict_do_update(
+        index_elements=['hash'], set_={'last_used_at': statement.excluded.last_used_at})
+    db.session.execute(statement, rows)
+
+
+def flush_prediction_rows(items):
+    """
+    Write-behind flusher: inserts a batch of (prediction_row(), payload rows)
+    items in one transaction.
+    """
+    payload_rows = {row["hash"]: row for _, rows in items for row in rows}
+    with app.app_context():
+        try:
+            insert_payload_rows(list(payload_rows.values()))
+            db.session.execute(db.insert(Prediction), [row for row, _ in items])
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+
+# On SQLite every save takes its ids from the allocator, write-behind or not:
+# a plain autoincrement insert (MAX(id) + 1) could land inside a block that
+# a write-behind process has handed out but not flushed yet. Without
+# write-behind it reserves exactly the ids it needs, so there are no gaps.
+# Postgres inserts draw from the same sequence as the allocator anyway.
+prediction_ids = None
+prediction_writer = None
+with app.app_context():
+    if WRITE_BEHIND_ENABLED or db.engine.dialect.name == 'sqlite':
+        prediction_ids = IdBlockAllocator(db.engine, Prediction.__tablename__,
+                                          block_size=50 if WRITE_BEHIND_ENABLED else 1)
+if WRITE_BEHIND_ENABLED:
+    prediction_writer = WriteBehindQueue(
+        flush_prediction_rows,
+        max_size=WRITE_BEHIND_MAX_QUEUE,
+        batch_size=WRITE_BEHIND_BATCH_SIZE,
+        flush_interval=WRITE_BEHIND_FLUSH_INTERVAL)
+
+
+def save_predictions(new_predictions):
+    """
+    Saves new Prediction rows. Normally that is one commit on the request's
+    session. With write-behind on, each row gets its final id and timestamp
+    right away and is queued for the background writer instead; rows that
+    don't fit in a full queue are committed here as before.
+    Returns the number of rows that were queued.
+    """
+    if prediction_writer is None:
+        if prediction_ids is not None:
+            for new_prediction, new_id in zip(new_predictions, prediction_ids.next_ids(len(new_predictions))):
+                new_prediction.id = new_id
+        payload_rows = weather_payload_rows(new_predictions)
+        insert_payload_rows(payload_rows)
+        db.session.add_all(new_predictions)
+        db.session.commit()
+        return 0
+
+    overflow = []
+    for new_prediction in new_predictions:
+        new_prediction.id = prediction_ids.next_id()
+        new_prediction.timestamp = datetime.datetime.utcnow()
+        # The queue gets plain copies, so the request thread can keep using the object
+        if not prediction_writer.submit((prediction_row(new_prediction), weather_payload_rows([new_prediction]))):
+            overflow.append(new_prediction)
+    if overflow:
+        payload_rows = weather_payload_rows(overflow)
+        insert_payload_rows(payload_rows)
+        db.session.execute(db.insert(Prediction), [prediction_row(p) for p in overflow])
+        db.session.commit()
+    return len(new_predictions) - len(overflow)
+
+
+def shutdown_write_behind():
+    """Flushes any queued predictions; called on worker exit."""
+    if prediction_writer is not None:
+        prediction_writer.stop()
+
+# --- Prediction History Queries ---
+
+def encode_cursor(prediction):
+    """Opaque /all cursor pointing just past this row in (timestamp, id) order."""
+    raw = f"{prediction.timestamp.isoformat()}|{prediction.id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Returns (timestamp, id) from encode_cursor() output. Raises ValueError if it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+        timestamp, prediction_id = raw.split('|')
+        return datetime.datetime.fromisoformat(timestamp), int(prediction_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def parse_timestamp_arg(args, name):
+    value = args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"'{name}' must be an ISO 8601 timestamp")
+
+
+def parse_fields_arg(args, allowed=PREDICTION_FIELDS):
+    """
+    Reads the ?fields=a,b,c projection. Returns the list of names, or None for
+    "everything". Raises ValueError for unknown names.
+    """
+    raw = args.get('fields')
+    if not raw:
+        return None
+    fields = [name.strip() for name in raw.split(',') if name.strip()]
+    unknown = [name for name in fields if name not in allowed]
+    if not fields or unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}. Available: {', '.join(allowed)}")
+    return fields
+
+
+def project_prediction_columns(query, fields):
+    """
+    Loads only the requested columns (plus id and timestamp, which paging needs).
+    Without a projection, everything is loaded, including the deferred live_weather.
+    Shared payloads are fetched in one extra query per page, once per distinct hash.
+    """
+    if fields is None:
+        return query.options(db.undefer_group('live_weather'), db.selectinload(Prediction.payload))
+    columns = set(fields) | {'id', 'timestamp'}
+    if 'live_weather' not in columns:
+        return query.options(db.load_only(*[getattr(Prediction, name) for name in columns]))
+    columns |= {'live_weather_z', 'payload_hash'}
+    return query.options(db.load_only(*[getattr(Prediction, name) for name in columns]),
+                         db.selectinload(Prediction.payload))
+
+
+def apply_history_filters(query, args):
+    """
+    Pushes the optional request filters into the SQL query:
+    city (case-insensitive), since / until (ISO timestamps, UTC) and intensity (intensity_tag).
+    Raises ValueError for malformed values.
+    """
+    city = args.get('city')
+    if city:
+        query = query.filter(db.func.lower(Prediction.city) == city.strip().lower())
+    since = parse_timestamp_arg(args, 'since')
+    if since is not None:
+        query = query.filter(Prediction.timestamp >= since)
+    until = parse_timestamp_arg(args, 'until')
+    if until is not None:
+        query = query.filter(Prediction.timestamp < until)
+    intensity = args.get('intensity')
+    if intensity:
+        query = query.filter(Prediction.intensity_tag == intensity)
+    return query
+
+
+def apply_keyset_page(query, args):
+    """
+    Orders newest first on (timestamp, id) and starts after the request's cursor.
+    Returns (query, limit). Each page is an index range scan, so its cost does
+    not grow with the size of the table.
+    """
+    try:
+        limit = int(args.get('limit', ALL_DEFAULT_LIMIT))
+    except ValueError:
+        raise ValueError("'limit' must be an integer")
+    if limit < 1 or limit > ALL_MAX_LIMIT:
+        raise ValueError(f"'limit' must be between 1 and {ALL_MAX_LIMIT}")
+
+    cursor = args.get('cursor')
+    if cursor:
+        cursor_timestamp, cursor_id = decode_cursor(cursor)
+        # Row-value comparison, so both SQLite and Postgres can seek straight into the index
+        query = query.filter(
+            db.tuple_(Prediction.timestamp, Prediction.id) < db.tuple_(cursor_timestamp, cursor_id))
+    return query.order_by(Prediction.timestamp.desc(), Prediction.id.desc()), limit
+
+# --- API Routes ---
+
+@app.route('/predict', methods=['POST'])
+def predict():
+    data = request.get_json()
+    if not data or 'city' not in data:
+        return jsonify({"error": "Anchor city is required"}), 400
+
+    anchor_city = data['city']
+    activity = data.get('activity', 'none')
+    scout_mode = data.get('scout_mode', 'full')
+    if scout_mode not in SCOUT_MODES:
+        return jsonify({"error": f"scout_mode must be one of: {', '.join(SCOUT_MODES)}"}), 400
+    try:
+        fields = parse_fields_arg(request.args, PREDICTION_FIELDS + PREDICT_EXTRA_FIELDS)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    # --- REMOVED: No longer need to get compare_locations from user ---
+    # compare_locations_str = data.get('compare_locations', '')
+    
+    if not WEATHER_API_KEY or WEATHER_API_KEY == "YOUR_API_KEY_GOES_HERE":
+        return jsonify({"error": "Server configuration error: Weather API key is missing."}), 500
+
+    # --- Step 1: Get weather for the Anchor City FIRST ---
+    anchor_city_weather_data = get_weather_for_city(anchor_city)
+    
+    if not anchor_city_weather_data or 'list' not in anchor_city_weather_data or not anchor_city_weather_data['list']:
+         return jsonify({"error": f"Could not retrieve weather data for anchor city: {anchor_city}"}), 404
+
+    # --- Step 2: Auto-detect nearby cities ---
+    all_cities_to_check, current_blocks = find_cities_to_check(anchor_city, anchor_city_weather_data, scout_mode)
+
+
+    # --- Location Scouting Logic ---
+    neighbour_cities = [city for city in all_cities_to_check if city.lower() != anchor_city.lower()]
+    if scout_mode == 'fast':
+        # Neighbours are scored from their current weather in the /find payload,
+        # so the whole ranking costs two upstream calls.
+        blocks_by_city = dict(current_blocks)
+    else:
+        # Fetch all the *other* nearby cities at once instead of one after another.
+        neighbour_weather = fetch_weather_for_cities(neighbour_cities)
+        blocks_by_city = {city: first_forecast_block(neighbour_weather[city]) for city in neighbour_cities}
+    # Use the data we fetched in Step 1 for the anchor
+    blocks_by_city[anchor_city] = first_forecast_block(anchor_city_weather_data)
+
+    location_ranking, activity_matrix = score_locations(activity, all_cities_to_check, blocks_by_city)
+
     # --- Save to Database (Only the *anchor city's* first forecast) ---
     try:
-        new_prediction = Prediction(
-            city=anchor_city,
-            live_weather=json.dumps(anchor_city_weather_data), # Store full JSON
-            ml_prediction_text=ml_text,
-            api_forecast_temp=first_forecast['main']['temp'],
-            api_forecast_amount_mm=rain_mm,
-            intensity_tag=intensity,
-            impact_index=impact,
-            api_feels_like=api_feels_like,
-            api_humidity=api_humidity,
-            api_wind_speed=api_wind_speed,
-            api_pop=api_pop,
-            activity_recommendation=first_block_recommendation
-        )
-        db.session.add(new_prediction)
-        db.session.commit()
-        print(f"Successfully processed and saved prediction {new_prediction.id} for {anchor_city}")
+        new_prediction = build_prediction(anchor_city, activity, anchor_city_weather_data)
+        queued = save_predictions([new_prediction])
+        print(f"Successfully processed and {'queued' if queued else 'saved'} prediction {new_prediction.id} for {anchor_city}")
 
         # --- Step 6: Return new prediction to frontend ---
-        final_response_data = new_prediction.to_dict()
+        final_response_data = new_prediction.to_dict(anchor_city_weather_data)
         final_response_data['location_ranking'] = location_ranking # <-- NEW: Add ranking
+        final_response_data['scout_mode'] = scout_mode
+        if activity_matrix is not None:
+            final_response_data['activity_matrix'] = activity_matrix
+        if fields is not None:
+            final_response_data = {name: final_response_data[name] for name in fields if name in final_response_data}
         
         return jsonify(final_response_data), 201
 
@@ -320,22 +1057,516 @@ def predict():
         return jsonify({"error": f"An internal server error occurred: {str(e)}"}), 500
 
 
+@app.route('/predict/batch', methods=['POST'])
+def predict_batch():
+    """
+    Runs /predict for a list of {city, activity} items in one call.
+    Every city (anchors and neighbours) is fetched once across the whole
+    batch, and all Prediction rows are saved in a single transaction.
+    """
+    data = request.get_json()
+    items = data.get('items') if isinstance(data, dict) else data
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "A non-empty list of {city, activity} items is required"}), 400
+    if len(items) > BATCH_MAX_ITEMS:
+        return jsonify({"error": f"At most {BATCH_MAX_ITEMS} items are allowed per batch"}), 400
+    if any(not isinstance(item, dict) or not item.get('city') for item in items):
+        return jsonify({"error": "Every item needs a city"}), 400
+
+    if not WEATHER_API_KEY or WEATHER_API_KEY == "YOUR_API_KEY_GOES_HERE":
+        return jsonify({"error": "Server configuration error: Weather API key is missing."}), 500
+
+    # --- Step 1: every distinct anchor city, fetched once and concurrently ---
+    weather_by_key = {}
+    fetch_missing_weather(weather_by_key, [item['city'] for item in items])
+
+    # --- Step 2: nearby cities for every anchor we have data for ---
+    anchors = {}
+    for item in items:
+        anchor_key = normalize_city(item['city'])
+        if anchor_key not in anchors and first_forecast_block(weather_by_key[anchor_key]) is not None:
+            anchors[anchor_key] = item['city']
+    scouted = get_scout_executor().map(
+        lambda city: find_cities_to_check(city, weather_by_key[normalize_city(city)])[0], anchors.values())
+    cities_by_anchor = dict(zip(anchors.keys(), scouted))
+
+    # --- Step 3: every neighbour we haven't fetched yet, once, concurrently ---
+    fetch_missing_weather(weather_by_key, [city for cities in cities_by_anchor.values() for city in cities])
+
+    # --- Step 4: one model call for every anchor, then score each item and save all rows in one transaction ---
+    rain_probabilities = {}
+    if rain_model is not None and anchors:
+        probabilities = rain_model.rain_probabilities([first_forecast_block(weather_by_key[key]) for key in anchors])
+        rain_probabilities = dict(zip(anchors, probabilities))
+
+    results = []
+    new_predictions = []
+    for item in items:
+        anchor_city = item['city']
+        activity = item.get('activity', 'none')
+        anchor_key = normalize_city(anchor_city)
+        if anchor_key not in cities_by_anchor:
+            results.append({"city": anchor_city, "error": f"Could not retrieve weather data for anchor city: {anchor_city}"})
+            continue
+
+        all_cities_to_check = cities_by_anchor[anchor_key]
+        blocks_by_city = {city: first_forecast_block(weather_by_key[normalize_city(city)]) for city in all_cities_to_check}
+        location_ranking, activity_matrix = score_locations(activity, all_cities_to_check, blocks_by_city)
+        new_prediction = build_prediction(anchor_city, activity, weather_by_key[anchor_key],
+                                          rain_probabilities.get(anchor_key))
+        new_predictions.append(new_prediction)
+        results.append((new_prediction, location_ranking, activity_matrix))
+
+    try:
+        queued = save_predictions(new_predictions)
+        print(f"Successfully processed {len(new_predictions)} batch predictions ({queued} queued for write-behind)")
+
+        response_data = []
+        for result in results:
+            if isinstance(result, tuple):
+                new_prediction, location_ranking, activity_matrix = result
+                result = new_prediction.to_dict(weather_by_key[normalize_city(new_prediction.city)])
+                result['location_ranking'] = location_ranking
+                if activity_matrix is not None:
+                    result['activity_matrix'] = activity_matrix
+            response_data.append(result)
+        return jsonify(response_data), 201
+
+    except Exception as e:
+        db.session.rollback()
+        print(f"An unexpected error occurred: {e}")
+        return jsonify({"error": f"An internal server error occurred: {str(e)}"}), 500
+
+
 @app.route('/all', methods=['GET'])
 def get_all_predictions():
+    """
+    Prediction history, newest first, one page at a time.
+    Query params: limit, cursor, city, since, until, intensity and fields
+    (a comma-separated projection; only those columns are read from the DB).
+    The body is a list as before; when there are more rows, the
+    X-Next-Cursor header holds the cursor for the next page.
+    """
     try:
-        all_predictions = Prediction.query.order_by(Prediction.timestamp.desc()).all()
-        predictions_list = [p.to_dict() for p in all_predictions]
-        return jsonify(predictions_list), 200
+        fields = parse_fields_arg(request.args)
+        query = project_prediction_columns(Prediction.query, fields)
+        query = apply_history_filters(query, request.args)
+        query, limit = apply_keyset_page(query, request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        page = query.limit(limit + 1).all()
+        has_more = len(page) > limit
+        page = page[:limit]
+        headers = {'X-Next-Cursor': encode_cursor(page[-1])} if has_more else None
+        return json_array_response([p.to_json(fields) for p in page], headers=headers)
     except Exception as e:
         print(f"Error fetching all predictions: {e}")
         return jsonify({"error": f"An internal server error occurred: {str(e)}"}), 500
 
 
-# --- Main execution ---
-if __name__ == '__main__':
-    # Create the database and tables if they don't exist
+def wants_gzip(args, accept_encodings):
+    """
+    ?gzip=1/0 if given, else whether Accept-Encoding (parsed with its
+    q-values, so "gzip;q=0" is a refusal) accepts gzip.
+    """
+    gzip_arg = args.get('gzip')
+    if gzip_arg is not None:
+        return gzip_arg.lower() in ('1', 'true', 'yes')
+    return accept_encodings['gzip'] > 0
+
+
+@app.route('/export', methods=['GET'])
+def export_predictions():
+    """
+    Streams the whole (filtered) history as newline-delimited JSON, oldest first.
+    Accepts the same city, since, until, intensity and fields params as /all.
+    Rows are read EXPORT_CHUNK_ROWS at a time (a server-side cursor on
+    Postgres) and written out chunk by chunk, so memory stays flat however
+    many rows there are. Gzipped (as Content-Encoding, so the saved file is
+    still plain NDJSON) when the client accepts it, or with ?gzip=1.
+    """
+    try:
+        fields = parse_fields_arg(request.args)
+        query = project_prediction_columns(Prediction.query, fields)
+        query = apply_history_filters(query, request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    query = query.order_by(Prediction.timestamp, Prediction.id).yield_per(EXPORT_CHUNK_ROWS)
+    use_gzip = wants_gzip(request.args, request.accept_encodings)
+
+    def generate():
+        # wbits=31 writes a gzip header and trailer rather than a bare zlib stream
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if use_gzip else None
+        lines = []
+        for prediction in query:
+            lines.append(prediction.to_json(fields))
+            if len(lines) >= EXPORT_CHUNK_ROWS:
+                chunk = ('\n'.join(lines) + '\n').encode('utf-8')
+                lines = []
+                yield compressor.compress(chunk) if compressor else chunk
+        chunk = ('\n'.join(lines) + '\n').encode('utf-8') if lines else b''
+        yield compressor.compress(chunk) + compressor.flush() if compressor else chunk
+
+    headers = {'Content-Disposition': 'attachment; filename=predictions.ndjson', 'Vary': 'Accept-Encoding'}
+    if use_gzip:
+        headers['Content-Encoding'] = 'gzip'
+    return app.response_class(stream_with_context(generate()), headers=headers, mimetype='application/x-ndjson')
+
+
+STATS_BUCKETS = ('hour', 'day', 'none')
+
+
+@app.route('/stats', methods=['GET'])
+def get_prediction_stats():
+    """
+    Per-city statistics over the raw predictions, aggregated in SQL.
+    Query params: bucket (hour, day or none; default day) plus the /all
+    filters city, since, until and intensity. One entry per (city, bucket):
+    count, counts per intensity_tag and impact_index, mean api_pop and max
+    api_forecast_amount_mm.
+    """
+    bucket_arg = request.args.get('bucket', 'day')
+    if bucket_arg not in STATS_BUCKETS:
+        return jsonify({"error": f"bucket must be one of: {', '.join(STATS_BUCKETS)}"}), 400
+
+    # bucket=none groups by city only: Postgres rejects a constant (NULL) in GROUP BY
+    bucket = None
+    if bucket_arg != 'none':
+        bucket = rollups.time_bucket(Prediction.timestamp, bucket_arg, db.engine.dialect.name).label('bucket_start')
+    group_columns = [Prediction.city] + ([bucket] if bucket is not None else [])
+    # One row per (city, bucket, intensity_tag, impact_index); at most a few per bucket
+    query = db.session.query(
+        *group_columns, Prediction.intensity_tag, Prediction.impact_index,
+        db.func.count(Prediction.id), db.func.sum(Prediction.api_pop), db.func.count(Prediction.api_pop),
+        db.func.max(Prediction.api_forecast_amount_mm))
+    try:
+        query = apply_history_filters(query, request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        rows = (query.group_by(*group_columns, Prediction.intensity_tag, Prediction.impact_index)
+                .order_by(*group_columns).all())
+    except Exception as e:
+        print(f"Error computing prediction stats: {e}")
+        return jsonify({"error": f"An internal server error occurred: {str(e)}"}), 500
+    if bucket is None:
+        rows = [(city, None) + tuple(rest) for city, *rest in rows]
+
+    stats = {}
+    for city, bucket_start, intensity, impact, count, pop_sum, pop_count, max_rain in rows:
+        if isinstance(bucket_start, str):
+            bucket_start = datetime.datetime.fromisoformat(bucket_start)  # SQLite returns text
+        entry = stats.setdefault((city, bucket_start), {
+            "city": city,
+            "bucket_start": bucket_start.isoformat() if bucket_start else None,
+            "count": 0, "intensity_counts": {}, "impact_counts": {},
+            "pop_sum": 0.0, "pop_count": 0, "max_api_forecast_amount_mm": None})
+        entry["count"] += count
+        # Same label as the rollups for rows written before these columns existed
+        intensity, impact = intensity or 'Unknown', impact or 'Unknown'
+        entry["intensity_counts"][intensity] = entry["intensity_counts"].get(intensity, 0) + count
+        entry["impact_counts"][impact] = entry["impact_counts"].get(impact, 0) + count
+        entry["pop_sum"] += pop_sum or 0
+        entry["pop_count"] += pop_count
+        if max_rain is not None:
+            entry["max_api_forecast_amount_mm"] = max(max_rain, entry["max_api_forecast_amount_mm"] or 0)
+
+    results = []
+    for entry in stats.values():
+        pop_sum, pop_count = entry.pop("pop_sum"), entry.pop("pop_count")
+        entry["mean_api_pop"] = pop_sum / pop_count if pop_count else None
+        results.append(entry)
+    return jsonify(results), 200
+
+
+@app.route('/rollups', methods=['GET'])
+def get_rollups():
+    """
+    Per-city hourly or daily aggregates from prediction_rollup (kept up to date
+    by `flask --app app rollup`), oldest bucket first.
+    Query params: granularity (hour or day, default day), city, since, until.
+    """
+    granularity = request.args.get('granularity', 'day')
+    if granularity not in rollups.GRANULARITIES:
+        return jsonify({"error": f"granularity must be one of: {', '.join(rollups.GRANULARITIES)}"}), 400
+    try:
+        since = parse_timestamp_arg(request.args, 'since')
+        until = parse_timestamp_arg(request.args, 'until')
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    table = rollups.prediction_rollup
+    query = db.select(table).where(table.c.granularity == granularity)
+    city = request.args.get('city')
+    if city:
+        query = query.where(db.func.lower(table.c.city) == city.strip().lower())
+    if since is not None:
+        query = query.where(table.c.bucket_start >= since)
+    if until is not None:
+        query = query.where(table.c.bucket_start < until)
+    rows = db.session.execute(query.order_by(table.c.bucket_start, table.c.city)).all()
+    return jsonify(rollups.summarize_buckets(rows)), 200
+
+
+@app.route('/cache/stats', methods=['GET'])
+def get_cache_stats():
+    if forecast_cache is None:
+        return jsonify({"forecast": None, "nearby": None, "nearby_weather": None}), 200
+    return jsonify({"forecast": forecast_cache.stats(), "nearby": nearby_cache.stats(),
+                    "nearby_weather": nearby_weather_cache.stats()}), 200
+
+
+@app.route('/inference/stats', methods=['GET'])
+def get_inference_stats():
+    # Per worker, like /write-behind/stats
+    if rain_batcher is None:
+        return jsonify({"batching": False, "model_loaded": rain_model is not None}), 200
+    return jsonify(dict(rain_batcher.stats(), batching=True, model_loaded=True, pid=os.getpid())), 200
+
+
+@app.route('/write-behind/stats', methods=['GET'])
+def get_write_behind_stats():
+    # Per worker: each gunicorn process has its own queue
+    if prediction_writer is None:
+        return jsonify({"enabled": False}), 200
+    return jsonify(dict(prediction_writer.stats(), enabled=True, pid=os.getpid())), 200
+
+
+# --- Database setup / migrations ---
+
+def migrate_database():
+    """Creates missing tables, then applies any pending schema migrations."""
     with app.app_context():
         db.create_all()
+        migrations.upgrade(db.engine)
+
+
+@app.cli.command('migrate')
+def migrate_command():
+    """Create tables and apply pending schema migrations."""
+    migrate_database()
+
+
+def database_size_bytes():
+    """Space used by the prediction table (Postgres) or the whole SQLite file, excluding free pages."""
+    if db.engine.dialect.name == 'postgresql':
+        return db.session.execute(db.text("SELECT pg_total_relation_size('prediction')")).scalar()
+    page_size = db.session.execute(db.text("PRAGMA page_size")).scalar()
+    page_count = db.session.execute(db.text("PRAGMA page_count")).scalar()
+    free_pages = db.session.execute(db.text("PRAGMA freelist_count")).scalar()
+    return (page_count - free_pages) * page_size
+
+
+@app.cli.command('compress-payloads')
+@click.option('--batch-size', default=500, help='Rows per transaction.')
+def compress_payloads_command(batch_size):
+    """Compress live_weather for rows stored before compression was on."""
+    size_before = database_size_bytes()
+    rows = raw_bytes = compressed_bytes = skipped = 0
+    last_id = 0
+    while True:
+        batch = (Prediction.query.options(db.undefer_group('live_weather'))
+                 .filter(Prediction.id > last_id, Prediction.live_weather_z.is_(None),
+                         Prediction.payload_hash.is_(None))
+                 .order_by(Prediction.id).limit(batch_size).all())
+        if not batch:
+            break
+        for prediction in batch:
+            payload_json = prediction.live_weather
+            if not is_json_object_text(payload_json):
+                # Left inline, where reads still check it and return the error object
+                print(f"  skipping prediction {prediction.id}: live_weather is not valid JSON")
+                skipped += 1
+                continue
+            prediction.live_weather_z = compress_payload(payload_json)
+            prediction.live_weather = ''
+            rows += 1
+            raw_bytes += len(payload_json.encode('utf-8'))
+            compressed_bytes += len(prediction.live_weather_z)
+        db.session.commit()
+        last_id = batch[-1].id
+        print(f"  compressed {rows} rows...")
+
+    if db.engine.dialect.name == 'sqlite':
+        db.session.execute(db.text("VACUUM"))  # Hand the freed pages back
+    size_after = database_size_bytes()
+
+    print(f"Compressed {rows} payloads: {raw_bytes:,} -> {compressed_bytes:,} bytes"
+          + (f" ({compressed_bytes / raw_bytes:.1%} of original)" if raw_bytes else ""))
+    if skipped:
+        print(f"Skipped {skipped} rows whose live_weather is not valid JSON")
+    print(f"Table/database size: {size_before:,} -> {size_after:,} bytes")
+
+
+@app.cli.command('dedupe-payloads')
+@click.option('--batch-size', default=500, help='Rows per transaction.')
+def dedupe_payloads_command(batch_size):
+    """Move inline live_weather payloads into the shared weather_payload table."""
+    size_before = database_size_bytes()
+    rows = skipped = 0
+    last_id = 0
+    while True:
+        batch = (Prediction.query.options(db.undefer_group('live_weather'))
+                 .filter(Prediction.id > last_id, Prediction.payload_hash.is_(None))
+                 .order_by(Prediction.id).limit(batch_size).all())
+        if not batch:
+            break
+        for prediction in batch:
+            payload_json = prediction.live_weather_text()
+            if not is_json_object_text(payload_json):
+                # Left inline, where reads still check it and return the error object
+                print(f"  skipping prediction {prediction.id}: live_weather is not valid JSON")
+                skipped += 1
+                continue
+            prediction.live_weather = ''
+            prediction.live_weather_z = None
+            prediction.payload_hash = payload_digest(payload_json)
+            prediction.pending_payload = payload_json
+            rows += 1
+        payload_rows = weather_payload_rows(batch)
+        insert_payload_rows(payload_rows)
+        db.session.commit()
+        last_id = batch[-1].id
+        print(f"  moved {rows} payloads...")
+
+    if db.engine.dialect.name == 'sqlite':
+        db.session.execute(db.text("VACUUM"))  # Hand the freed pages back
+    size_after = database_size_bytes()
+    print(f"Moved {rows} inline payloads to weather_payload")
+    if skipped:
+        print(f"Skipped {skipped} rows whose live_weather is not valid JSON")
+    print(f"Table/database size: {size_before:,} -> {size_after:,} bytes")
+    print_payload_report()
+
+
+def print_payload_report():
+    referencing = (db.session.query(db.func.count(Prediction.id), db.func.sum(WeatherPayload.raw_size),
+                                    db.func.sum(db.func.length(WeatherPayload.data_z)))
+                   .join(WeatherPayload, Prediction.payload_hash == WeatherPayload.hash).one())
+    rows, raw_bytes, per_row_bytes = referencing[0], referencing[1] or 0, referencing[2] or 0
+    distinct, stored_bytes = db.session.query(
+        db.func.count(WeatherPayload.hash), db.func.sum(db.func.length(WeatherPayload.data_z))).one()
+    stored_bytes = stored_bytes or 0
+    inline = Prediction.query.filter(Prediction.payload_hash.is_(None)).count()
+
+    print(f"{rows:,} predictions share {distinct:,} distinct payloads ({inline:,} rows still inline)")
+    print(f"  raw JSON, one copy per row:        {raw_bytes:>14,} bytes")
+    print(f"  compressed, one copy per row:      {per_row_bytes:>14,} bytes")
+    print(f"  stored (compressed, deduplicated): {stored_bytes:>14,} bytes")
+    if raw_bytes:
+        print(f"  saved {raw_bytes - stored_bytes:,} bytes vs raw ({stored_bytes / raw_bytes:.1%} of raw), "
+              f"{per_row_bytes - stored_bytes:,} bytes vs per-row compression")
+
+
+@app.cli.command('payload-report')
+def payload_report_command():
+    """Report how much storage payload deduplication saves."""
+    print_payload_report()
+
+
+@app.cli.command('train-payload-dictionary')
+@click.option('--samples', default=500, help='How many recent payloads to train on.')
+@click.option('--holdout', default=0.2, help='Fraction of the newest payloads kept out of training to measure the gain on.')
+@click.option('--size', default=16 * 1024, help='Dictionary size in bytes.')
+def train_payload_dictionary_command(samples, size, holdout):
+    """Train a shared compression dictionary on recent payloads."""
+    recent = (project_prediction_columns(Prediction.query, ['live_weather'])
+              .order_by(Prediction.id.desc()).limit(samples).all())
+    # Shared payloads only count once
+    payloads = list(dict.fromkeys(p.live_weather_text() for p in recent))
+    if not payloads:
+        print("No payloads to train on yet.")
+        return
+
+    # Train on the older payloads and measure on the newest ones, which stand
+    # in for rows written later; measured on its own samples, a (zlib)
+    # dictionary mostly just matches itself
+    held_out_count = int(len(payloads) * holdout) if len(payloads) > 1 else 0
+    held_out = payloads[:held_out_count]
+    training = payloads[held_out_count:]
+
+    dictionary = train_dictionary(training, size=size)
+    name = save_dictionary(dictionary)
+    print(f"Saved {len(dictionary):,}-byte dictionary (trained on {len(training)} payloads) as {name}")
+    if held_out:
+        raw_total = sum(len(p.encode('utf-8')) for p in held_out)
+        plain_total = sum(len(compress_payload(p, dictionary=b'')) for p in held_out)
+        dict_total = sum(len(compress_payload(p, dictionary=dictionary)) for p in held_out)
+        print(f"On {len(held_out)} newer held-out payloads: raw {raw_total:,} B, compressed {plain_total:,} B, "
+              f"with dictionary {dict_total:,} B")
+    else:
+        print("Too few payloads to hold any out; gain not measured.")
+    print(f"Set PAYLOAD_DICTIONARY={name} to use it, and keep (commit) the file for as long as rows use it.")
+
+
+@app.cli.command('rollup')
+def rollup_command():
+    """Roll completed hours and days of predictions up into prediction_rollup."""
+    added = rollups.run_rollups(db.engine, Prediction.__table__, lag_seconds=ROLLUP_LAG_SECONDS)
+    print(f"Added {added['hour']} hourly and {added['day']} daily rollup rows")
+
+
+@app.cli.command('prune-predictions')
+@click.option('--older-than-days', default=PREDICTION_RETENTION_DAYS, help='Keep raw rows newer than this.')
+@click.option('--archive-dir', default=None, help='Write pruned rows here as gzipped NDJSON first.')
+@click.option('--batch-size', default=1000, help='Rows deleted per transaction.')
+def prune_predictions_command(older_than_days, archive_dir, batch_size):
+    """Delete (optionally archiving) raw predictions that are old and already rolled up."""
+    rollups.run_rollups(db.engine, Prediction.__table__, lag_seconds=ROLLUP_LAG_SECONDS)
+    with db.engine.connect() as conn:
+        rolled_up_until = rollups.get_watermark(conn, 'hour')
+    if rolled_up_until is None:
+        print("Nothing has been rolled up yet; not pruning.")
+        return
+    # Never drop a row whose hour hasn't been aggregated
+    cutoff = min(datetime.datetime.utcnow() - datetime.timedelta(days=older_than_days), rolled_up_until)
+
+    archive = None
+    if archive_dir:
+        os.makedirs(archive_dir, exist_ok=True)
+        archive_path = os.path.join(archive_dir, f"predictions-before-{cutoff:%Y%m%dT%H%M%S}.ndjson.gz")
+        archive = gzip.open(archive_path, 'at', encoding='utf-8')
+
+    deleted = 0
+    try:
+        while True:
+            batch = (project_prediction_columns(Prediction.query, None)
+                     .filter(Prediction.timestamp < cutoff)
+                     .order_by(Prediction.timestamp, Prediction.id).limit(batch_size).all())
+            if not batch:
+                break
+            if archive is not None:
+                # Archived before the delete commits, so a crash can only duplicate rows, never lose them
+                archive.write(''.join(p.to_json() + '\n' for p in batch))
+                archive.flush()
+            Prediction.query.filter(Prediction.id.in_([p.id for p in batch])).delete(synchronize_session=False)
+            db.session.commit()
+            deleted += len(batch)
+    finally:
+        if archive is not None:
+            archive.close()
+
+    # Shared payloads no remaining prediction points at. Recently written ones
+    # are kept: a save may be about to commit a prediction that uses them
+    # (Postgres re-checks last_used_at after waiting on that save's row lock)
+    idle_since = datetime.datetime.utcnow() - datetime.timedelta(seconds=PAYLOAD_ORPHAN_GRACE_SECONDS)
+    orphaned = db.session.execute(db.delete(WeatherPayload).where(
+        ~db.exists().where(Prediction.payload_hash == WeatherPayload.hash),
+        db.func.coalesce(WeatherPayload.last_used_at, WeatherPayload.created_at) < idle_since)).rowcount
+    db.session.commit()
+    if orphaned:
+        print(f"Removed {orphaned:,} payloads no longer referenced")
+
+    print(f"Pruned {deleted:,} predictions older than {cutoff.isoformat()}"
+          + (f" (archived to {archive_path})" if archive is not None else ""))
+
+
+# --- Main execution ---
+if __name__ == '__main__':
+    # Create the database and tables if they don't exist, then migrate
+    migrate_database()
     
     # Run the app
     app.run(host='0.0.0.0', port=5000, debug=True)
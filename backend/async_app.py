@@ -0,0 +1,252 @@
+# async_app.py
+# asyncio variant of the /predict pipeline, served by aiohttp next to the Flask app.
+# A sync gunicorn worker handles one /predict at a time and spends most of it
+# waiting on OpenWeatherMap; one of these workers keeps many requests in flight.
+#
+# Run it as its own gunicorn service (Flask keeps serving every other route):
+#   gunicorn -c gunicorn_config.py -k aiohttp.GunicornWebWorker async_app:web_app
+
+import json
+import time
+import asyncio
+import aiohttp
+from aiohttp import web
+
+import owm_client
+from forecast_cache import next_forecast_block_boundary
+from app import (
+    app, db, WEATHER_API_KEY, WEATHER_API_URL, NEARBY_API_URL, SCOUT_MODES,
+    NEARBY_CACHE_TTL_SECONDS, NEARBY_WEATHER_TTL_SECONDS,
+    forecast_cache, nearby_cache, nearby_weather_cache,
+    normalize_city, get_geo_tile, first_forecast_block, block_from_current_weather,
+    score_locations, build_prediction, save_predictions, migrate_database
+)
+
+
+# --- Async OpenWeatherMap client ---
+
+async def owm_get_json(session, url, params):
+    """
+    GET an OWM endpoint with the same timeouts and retry budget as owm_client.
+    Returns (status_code, parsed JSON on 200 / response text otherwise).
+    Raises aiohttp.ClientError or asyncio.TimeoutError once retries run out.
+    """
+    params = {key: str(value) for key, value in params.items()}
+    for attempt in range(owm_client.MAX_RETRIES + 1):
+        is_last_attempt = attempt == owm_client.MAX_RETRIES
+        try:
+            async with session.get(url, params=params) as response:
+                if response.status == 200:
+                    return 200, await response.json(content_type=None)
+                if response.status not in owm_client.RETRY_STATUSES or is_last_attempt:
+                    return response.status, await response.text()
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            if is_last_attempt:
+                raise
+        await asyncio.sleep(owm_client.BACKOFF_FACTOR * (2 ** attempt))
+
+
+# Concurrent misses for the same city share one fetch (per worker)
+_inflight_fetches = {}
+
+
+async def get_weather_for_city(session, city_name):
+    """
+    Async get_weather_for_city(): shared forecast cache first, then one
+    coalesced upstream fetch per city. Returns the JSON data or None.
+    """
+    cache_key = normalize_city(city_name)
+    if forecast_cache is not None:
+        cached = await asyncio.to_thread(forecast_cache.get, cache_key)
+        if cached is not None:
+            return cached
+
+    task = _inflight_fetches.get(cache_key)
+    if task is None:
+        task = asyncio.ensure_future(fetch_weather_for_city(session, city_name, cache_key))
+        _inflight_fetches[cache_key] = task
+        task.add_done_callback(lambda _: _inflight_fetches.pop(cache_key, None))
+    # shield: one caller going away must not cancel the fetch for the others
+    return await asyncio.shield(task)
+
+
+async def fetch_weather_for_city(session, city_name, cache_key):
+    params = {
+        'q': city_name,
+        'appid': WEATHER_API_KEY,
+        'units': 'metric',
+        'cnt': 1
+    }
+    try:
+        status, payload = await owm_get_json(session, WEATHER_API_URL, params)
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        print(f"Network error for {city_name}: {e!r}")
+        return None
+    if status != 200:
+        print(f"Weather API error for {city_name}: {payload}")
+        return None
+    if forecast_cache is not None:
+        await asyncio.to_thread(forecast_cache.set, cache_key, payload, next_forecast_block_boundary())
+    return payload
+
+
+async def get_nearby_items(session, lat, lon, scout_mode):
+    """
+    Async counterpart of get_nearby_city_names() / get_nearby_current_weather().
+    Returns a list of /find items ('name' only in full mode), or None.
+    """
+    tile = get_geo_tile(lat, lon)
+    cache = nearby_weather_cache if scout_mode == 'fast' else nearby_cache
+    if cache is not None:
+        cached = await asyncio.to_thread(cache.get, tile)
+        if cached is not None:
+            return cached if scout_mode == 'fast' else [{'name': name} for name in cached]
+
+    nearby_params = {
+        'lat': lat,
+        'lon': lon,
+        'cnt': 6, # Get anchor city + 5 nearby
+        'appid': WEATHER_API_KEY,
+        'units': 'metric'
+    }
+    status, payload = await owm_get_json(session, NEARBY_API_URL, nearby_params)
+    if status != 200:
+        print(f"Error finding nearby cities: {payload}")
+        return None
+    if 'list' not in payload:
+        return None
+
+    items = [{key: item.get(key) for key in ('name', 'main', 'wind', 'rain')} for item in payload['list']]
+    if nearby_cache is not None:
+        city_names = [item['name'] for item in items]
+        await asyncio.to_thread(nearby_cache.set, tile, city_names, time.time() + NEARBY_CACHE_TTL_SECONDS)
+        await asyncio.to_thread(nearby_weather_cache.set, tile, items, time.time() + NEARBY_WEATHER_TTL_SECONDS)
+    return items
+
+
+async def find_cities_to_check(session, anchor_city, anchor_city_weather_data, scout_mode):
+    """Async find_cities_to_check(): returns (all_cities_to_check, current_blocks)."""
+    all_cities_to_check = [anchor_city]
+    current_blocks = {}
+    try:
+        coord = anchor_city_weather_data.get('city', {}).get('coord', {})
+        lat = coord.get('lat')
+        lon = coord.get('lon')
+
+        if lat and lon:
+            for item in await get_nearby_items(session, lat, lon, scout_mode) or []:
+                city_name = item['name']
+                if city_name.lower() != anchor_city.lower() and city_name not in all_cities_to_check:
+                    all_cities_to_check.append(city_name)
+                    if scout_mode == 'fast':
+                        current_blocks[city_name] = block_from_current_weather(item)
+        else:
+            print("Could not find coords in anchor city data.")
+    except Exception as e:
+        print(f"Error during nearby city search: {e!r}")
+        # Non-fatal, we can continue with just the anchor city
+    return all_cities_to_check, current_blocks
+
+
+def save_prediction(prediction, live_weather_data):
+    """Blocking DB write; run in a worker thread so the event loop keeps going."""
+    with app.app_context():
+        try:
+            save_predictions([prediction])
+            return prediction.to_dict(live_weather_data)
+        except Exception:
+            db.session.rollback()
+            raise
+
+
+# --- Routes ---
+
+async def predict(request):
+    try:
+        data = await request.json()
+    except json.JSONDecodeError:
+        data = None
+    if not data or 'city' not in data:
+        return web.json_response({"error": "Anchor city is required"}, status=400)
+
+    anchor_city = data['city']
+    activity = data.get('activity', 'none')
+    scout_mode = data.get('scout_mode', 'full')
+    if scout_mode not in SCOUT_MODES:
+        return web.json_response({"error": f"scout_mode must be one of: {', '.join(SCOUT_MODES)}"}, status=400)
+
+    session = request.app['owm_session']
+
+    # --- Step 1: Anchor city ---
+    anchor_city_weather_data = await get_weather_for_city(session, anchor_city)
+    if first_forecast_block(anchor_city_weather_data) is None:
+        return web.json_response(
+            {"error": f"Could not retrieve weather data for anchor city: {anchor_city}"}, status=404)
+
+    # --- Step 2: Nearby cities, fetched all at once ---
+    all_cities_to_check, current_blocks = await find_cities_to_check(
+        session, anchor_city, anchor_city_weather_data, scout_mode)
+    neighbour_cities = [city for city in all_cities_to_check if city.lower() != anchor_city.lower()]
+    if scout_mode == 'fast':
+        blocks_by_city = dict(current_blocks)
+    else:
+        neighbour_weather = await asyncio.gather(
+            *(get_weather_for_city(session, city) for city in neighbour_cities))
+        blocks_by_city = {city: first_forecast_block(weather)
+                          for city, weather in zip(neighbour_cities, neighbour_weather)}
+    blocks_by_city[anchor_city] = first_forecast_block(anchor_city_weather_data)
+
+    location_ranking, activity_matrix = score_locations(activity, all_cities_to_check, blocks_by_city)
+
+    # --- Save to Database without blocking the loop ---
+    try:
+        # In a thread: the model call may wait a few ms to be batched with other requests
+        new_prediction = await asyncio.to_thread(build_prediction, anchor_city, activity, anchor_city_weather_data)
+        final_response_data = await asyncio.to_thread(save_prediction, new_prediction, anchor_city_weather_data)
+    except Exception as e:
+        print(f"An unexpected error occurred: {e!r}")
+        return web.json_response({"error": f"An internal server error occurred: {str(e)}"}, status=500)
+
+    print(f"Successfully processed and saved prediction {final_response_data['id']} for {anchor_city}")
+    final_response_data['location_ranking'] = location_ranking
+    final_response_data['scout_mode'] = scout_mode
+    if activity_matrix is not None:
+        final_response_data['activity_matrix'] = activity_matrix
+    return web.json_response(final_response_data, status=201)
+
+
+@web.middleware
+async def cors_middleware(request, handler):
+    # Same open CORS policy as CORS(app) on the Flask side
+    if request.method == 'OPTIONS':
+        response = web.Response()
+    else:
+        response = await handler(request)
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    response.headers['Access-Control-Allow-Headers'] = 'Content-Type'
+    response.headers['Access-Control-Allow-Methods'] = 'POST, OPTIONS'
+    return response
+
+
+async def open_owm_session(web_app):
+    connector = aiohttp.TCPConnector(limit=owm_client.POOL_SIZE * 10, keepalive_timeout=30)
+    timeout = aiohttp.ClientTimeout(sock_connect=owm_client.CONNECT_TIMEOUT, sock_read=owm_client.READ_TIMEOUT)
+    web_app['owm_session'] = aiohttp.ClientSession(
+        connector=connector, timeout=timeout, headers={'Accept': 'application/json'})
+
+
+async def close_owm_session(web_app):
+    await web_app['owm_session'].close()
+
+
+web_app = web.Application(middlewares=[cors_middleware])
+web_app.router.add_route('POST', '/async/predict', predict)
+web_app.router.add_route('OPTIONS', '/async/predict', predict)
+web_app.on_startup.append(open_owm_session)
+web_app.on_cleanup.append(close_owm_session)
+
+
+if __name__ == '__main__':
+    # Create the database and tables if they don't exist, then migrate
+    migrate_database()
+    web.run_app(web_app, host='0.0.0.0', port=5001)
@@ -0,0 +1,118 @@
+# bench_async_predict.py
+# Requests/sec per worker: Flask /predict on a sync gunicorn worker vs the
+# aiohttp /async/predict variant, both talking to a local OWM stand-in that
+# answers every call after a fixed latency. The forecast cache is switched
+# off so every request pays its full set of upstream calls.
+#
+# Usage: python bench_async_predict.py [--latency-ms 100] [--concurrency 32] [--duration 10]
+
+import os
+import sys
+import time
+import socket
+import random
+import asyncio
+import argparse
+import tempfile
+import subprocess
+import aiohttp
+
+from owm_stub import OWMStub, start_stub_in_thread
+
+BACKEND_DIR = os.path.abspath(os.path.dirname(__file__))
+
+
+# --- Helpers ---
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Nothing listening on port {port} after {timeout}s")
+
+
+def start_server(target, port, env, worker_class=None):
+    cmd = [sys.executable, '-m', 'gunicorn', '-w', '1', '-b', f'127.0.0.1:{port}', '--log-level', 'warning']
+    if worker_class:
+        cmd += ['-k', worker_class]
+    cmd.append(target)
+    proc = subprocess.Popen(cmd, cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL)
+    wait_for_port(port)
+    return proc
+
+
+async def drive(url, concurrency, duration):
+    """Keeps `concurrency` POSTs in flight for `duration` seconds. Returns (ok, errors, elapsed)."""
+    ok = errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def client(session):
+        nonlocal ok, errors
+        while time.perf_counter() < deadline:
+            body = {"city": f"City-{random.randrange(1000)}", "activity": "run"}
+            try:
+                async with session.post(url, json=body) as response:
+                    await response.read()
+                    if response.status == 201:
+                        ok += 1
+                    else:
+                        errors += 1
+            except aiohttp.ClientError:
+                errors += 1
+
+    start = time.perf_counter()
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=60)) as session:
+        await asyncio.gather(*(client(session) for _ in range(concurrency)))
+    return ok, errors, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sync vs async /predict throughput per worker')
+    parser.add_argument('--latency-ms', type=float, default=100)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=10)
+    args = parser.parse_args()
+
+    stub_url = start_stub_in_thread(OWMStub(latency_ms=args.latency_ms), free_port())
+    workdir = tempfile.mkdtemp(prefix='bench_async_')
+    env = dict(os.environ,
+               OWM_BASE_URL=stub_url,
+               FORECAST_CACHE_ENABLED='0',
+               DATABASE_URL='sqlite:///' + os.path.join(workdir, 'bench.db'))
+
+    # Create the tables once, up front
+    subprocess.run([sys.executable, '-c', 'from app import app, db\nwith app.app_context(): db.create_all()'],
+                   cwd=BACKEND_DIR, env=env, check=True, stdout=subprocess.DEVNULL)
+
+    print(f"Upstream latency {args.latency_ms:.0f} ms, concurrency {args.concurrency}, "
+          f"{args.duration:.0f}s per run, 1 gunicorn worker each\n")
+    print(f"{'variant':<28}{'ok':>8}{'errors':>8}{'req/s':>10}")
+    variants = [
+        ('Flask /predict (sync)', 'app:app', None, '/predict'),
+        ('aiohttp /async/predict', 'async_app:web_app', 'aiohttp.GunicornWebWorker', '/async/predict'),
+    ]
+    for name, target, worker_class, path in variants:
+        port = free_port()
+        proc = start_server(target, port, env, worker_class)
+        try:
+            ok, errors, elapsed = asyncio.run(
+                drive(f"http://127.0.0.1:{port}{path}", args.concurrency, args.duration))
+        finally:
+            proc.terminate()
+            proc.wait()
+        print(f"{name:<28}{ok:>8}{errors:>8}{ok / elapsed:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
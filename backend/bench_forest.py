@@ -0,0 +1,93 @@
+# bench_forest.py
+# Parity and latency of forest_arrays.FlatForest against sklearn for the rain
+# model (plan_a_model.pkl + plan_a_scaler.pkl).
+#
+# Parity: P(rain) on the held-out rows (plan_a_X_test.npy, unscaled back to
+# raw features) plus random rows around them must match scaler.transform()
+# + predict_proba(). Exits non-zero if it doesn't.
+# Latency: median per-call time for batch sizes 1, 40 (a /predict/batch) and 10k.
+#
+# Usage: python bench_forest.py [--repeats 50]
+
+import os
+import sys
+import time
+import argparse
+import statistics
+import warnings
+import numpy as np
+import joblib
+
+from forest_arrays import export_forest
+from rain_model import BACKEND_DIR
+
+BATCH_SIZES = (1, 40, 10000)
+
+
+def sklearn_probabilities(model, scaler, X):
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', UserWarning)  # The scaler was fitted on named columns
+        return model.predict_proba(scaler.transform(X))[:, list(model.classes_).index(1)]
+
+
+def parity_rows(scaler, n_random=20000, seed=0):
+    X_test = scaler.inverse_transform(np.load(os.path.join(BACKEND_DIR, 'plan_a_X_test.npy')))
+    rng = np.random.default_rng(seed)
+    # Spread around the real rows, RainToday kept 0/1
+    noisy = X_test[rng.integers(len(X_test), size=n_random)] + rng.normal(0, 1, (n_random, X_test.shape[1])) * scaler.scale_
+    noisy[:, -1] = rng.integers(0, 2, size=n_random)
+    return np.vstack([X_test, noisy])
+
+
+def time_call(fn, repeats):
+    fn()  # warm-up
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='FlatForest vs sklearn parity and latency')
+    parser.add_argument('--repeats', type=int, default=50)
+    args = parser.parse_args()
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')  # sklearn version mismatch on unpickling
+        model = joblib.load(os.path.join(BACKEND_DIR, 'plan_a_model.pkl'))
+        scaler = joblib.load(os.path.join(BACKEND_DIR, 'plan_a_scaler.pkl'))
+
+    start = time.perf_counter()
+    forest = export_forest(model, scaler)
+    export_ms = (time.perf_counter() - start) * 1000
+    print(f"Exported {len(forest.roots)} trees, {len(forest.feature):,} nodes, max depth {forest.max_depth} "
+          f"in {export_ms:.1f} ms")
+
+    # --- Parity ---
+    X = parity_rows(scaler)
+    expected = sklearn_probabilities(model, scaler, X)
+    actual = forest.rain_probabilities(X)
+    max_diff = np.abs(expected - actual).max()
+    mismatched = int((np.abs(expected - actual) > 1e-9).sum())
+    print(f"Parity on {len(X):,} rows: max |diff| {max_diff:.2e}, {mismatched} rows differ")
+
+    # --- Latency ---
+    print(f"\n{'batch':>7}{'sklearn ms':>13}{'arrays ms':>12}{'speedup':>10}")
+    for size in BATCH_SIZES:
+        batch = X[np.arange(size) % len(X)]
+        repeats = args.repeats if size < 10000 else max(args.repeats // 10, 3)
+        sklearn_ms = time_call(lambda: sklearn_probabilities(model, scaler, batch), repeats)
+        arrays_ms = time_call(lambda: forest.rain_probabilities(batch), repeats)
+        print(f"{size:>7}{sklearn_ms:>13.3f}{arrays_ms:>12.3f}{sklearn_ms / arrays_ms:>9.1f}x")
+
+    # The folded thresholds reproduce sklearn's float32 split decisions, so
+    # only summation-order noise is allowed
+    if mismatched:
+        print("PARITY CHECK FAILED")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
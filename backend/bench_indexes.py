@@ -0,0 +1,127 @@
+# bench_indexes.py
+# Times the /all and per-city history queries on a large prediction table,
+# before and after the migrations.py indexes are applied.
+# Builds its own scratch database (temporary SQLite file by default);
+# pass --db-url to run it against an EMPTY Postgres database instead.
+#
+# Usage: python bench_indexes.py [--rows 1000000] [--db-url postgresql://...]
+
+import os
+import time
+import random
+import argparse
+import datetime
+import tempfile
+import statistics
+from sqlalchemy import (create_engine, inspect, MetaData, Table, Column, Integer, Text, REAL, DateTime,
+                        select, func, and_, tuple_)
+
+import migrations
+
+CITIES = [f"City {i}" for i in range(200)] + ['Mumbai', 'Pune', 'New Delhi', 'Chennai', 'Kolkata']
+
+# The prediction table as it was before any migration (no secondary indexes)
+metadata = MetaData()
+prediction = Table(
+    'prediction', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('city', Text, nullable=False),
+    Column('live_weather', Text, nullable=False),
+    Column('ml_prediction_text', Text),
+    Column('api_forecast_temp', REAL),
+    Column('api_forecast_amount_mm', REAL),
+    Column('intensity_tag', Text),
+    Column('impact_index', Text),
+    Column('api_feels_like', REAL),
+    Column('api_humidity', REAL),
+    Column('api_wind_speed', REAL),
+    Column('api_pop', REAL),
+    Column('timestamp', DateTime),
+    Column('activity_recommendation', Text),
+)
+
+
+def fill(engine, n_rows, chunk=20000):
+    rng = random.Random(42)
+    start = datetime.datetime(2024, 1, 1)
+    span_seconds = 2 * 365 * 24 * 3600
+    with engine.begin() as conn:
+        for offset in range(0, n_rows, chunk):
+            rows = []
+            for _ in range(min(chunk, n_rows - offset)):
+                rain = rng.choice([0, 0, 0, round(rng.uniform(0.1, 15), 2)])
+                rows.append({
+                    'city': rng.choice(CITIES),
+                    'live_weather': '{"list": []}',
+                    'api_forecast_temp': rng.uniform(10, 40),
+                    'api_forecast_amount_mm': rain,
+                    'intensity_tag': 'No Rain' if rain == 0 else 'Light Rain',
+                    'api_pop': rng.random(),
+                    'timestamp': start + datetime.timedelta(seconds=rng.randrange(span_seconds)),
+                })
+            conn.execute(prediction.insert(), rows)
+            print(f"  inserted {offset + len(rows):,} rows", end='\r')
+    print()
+
+
+def history_queries():
+    columns = [prediction.c.id, prediction.c.city, prediction.c.timestamp, prediction.c.intensity_tag]
+    newest_first = (prediction.c.timestamp.desc(), prediction.c.id.desc())
+    cursor_ts = datetime.datetime(2025, 1, 1)
+    return {
+        '/all first page': select(*columns).order_by(*newest_first).limit(100),
+        '/all deep keyset page': select(*columns).where(
+            tuple_(prediction.c.timestamp, prediction.c.id) < tuple_(cursor_ts, 500000)
+        ).order_by(*newest_first).limit(100),
+        '/all?city= (lower)': select(*columns).where(
+            func.lower(prediction.c.city) == 'pune').order_by(*newest_first).limit(100),
+        'city + time range count': select(func.count()).select_from(prediction).where(and_(
+            prediction.c.city == 'Mumbai',
+            prediction.c.timestamp >= datetime.datetime(2024, 6, 1),
+            prediction.c.timestamp < datetime.datetime(2024, 7, 1))),
+    }
+
+
+def time_queries(engine, repeats):
+    results = {}
+    with engine.connect() as conn:
+        for name, query in history_queries().items():
+            timings = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                conn.execute(query).fetchall()
+                timings.append(time.perf_counter() - start)
+            results[name] = statistics.median(timings) * 1000
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='prediction index benchmark')
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--db-url', default=None, help='scratch database URL (default: temporary SQLite file)')
+    args = parser.parse_args()
+
+    db_url = args.db_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='bench_indexes_'), 'bench.db')
+    engine = create_engine(db_url)
+    if inspect(engine).has_table('prediction'):
+        raise SystemExit("Refusing to run: this database already has a prediction table")
+
+    print(f"Filling {engine.url.render_as_string(hide_password=True)} with {args.rows:,} rows...")
+    metadata.create_all(engine)
+    fill(engine, args.rows)
+
+    before = time_queries(engine, args.repeats)
+    start = time.perf_counter()
+    migrations.upgrade(engine)
+    migrate_seconds = time.perf_counter() - start
+    after = time_queries(engine, args.repeats)
+
+    print(f"\nMigration (index build) took {migrate_seconds:.1f}s\n")
+    print(f"{'query':<28}{'before ms':>12}{'after ms':>12}{'speedup':>10}")
+    for name in before:
+        print(f"{name:<28}{before[name]:>12.2f}{after[name]:>12.2f}{before[name] / after[name]:>9.0f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+# bench_micro_batcher.py
+# Rain-model throughput and latency for N concurrent callers (threads, as in a
+# gthread worker): one model call per request vs micro_batcher.MicroBatcher.
+# Runs with both evaluators, since the gain depends on the per-call overhead:
+# large for sklearn's predict_proba, smaller for forest_arrays.
+#
+# Usage: python bench_micro_batcher.py [--threads 16] [--duration 5] [--max-wait-ms 2]
+
+import time
+import random
+import argparse
+import threading
+import warnings
+
+import rain_model
+from micro_batcher import MicroBatcher
+from load_test import percentile
+
+
+def sample_block(rng):
+    rain = rng.choice([0, 0, 0, rng.uniform(0.1, 10)])
+    temp = rng.uniform(10, 38)
+    return {"main": {"temp": temp, "temp_min": temp - rng.uniform(0, 4), "temp_max": temp + rng.uniform(0, 4),
+                     "humidity": rng.uniform(30, 100), "pressure": rng.uniform(995, 1025)},
+            "wind": {"speed": rng.uniform(0, 12)}, "rain": {"3h": rain}}
+
+
+def drive(predict_one, threads, duration):
+    latencies = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def caller(seed):
+        rng = random.Random(seed)
+        mine = []
+        while time.perf_counter() < deadline:
+            row = rain_model.features_from_block(sample_block(rng))
+            start = time.perf_counter()
+            predict_one(row)
+            mine.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(mine)
+
+    workers = [threading.Thread(target=caller, args=(i,)) for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    latencies.sort()
+    return len(latencies) / duration, percentile(latencies, 50) * 1000, percentile(latencies, 99) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Micro-batched vs per-request rain model calls')
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=5)
+    parser.add_argument('--max-batch', type=int, default=64)
+    parser.add_argument('--max-wait-ms', type=float, default=2)
+    args = parser.parse_args()
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')  # sklearn version mismatch on unpickling
+        # The pickles, so both evaluators are available
+        model = rain_model.load_rain_model(use_artifact=False)
+
+    print(f"{args.threads} concurrent callers, {args.duration:.0f}s per run, "
+          f"max batch {args.max_batch}, max wait {args.max_wait_ms} ms\n")
+    print(f"{'evaluator':<10}{'mode':<10}{'calls/s':>10}{'p50 ms':>9}{'p99 ms':>9}{'mean batch':>12}{'delay p50 ms':>14}")
+    forest = model.forest
+    for evaluator in ('sklearn', 'arrays'):
+        model.forest = forest if evaluator == 'arrays' else None
+        rps, p50, p99 = drive(lambda row: model.probabilities_from_features([row])[0], args.threads, args.duration)
+        print(f"{evaluator:<10}{'direct':<10}{rps:>10.0f}{p50:>9.2f}{p99:>9.2f}{'-':>12}{'-':>14}")
+
+        batcher = MicroBatcher(model.probabilities_from_features, max_batch=args.max_batch, max_wait_ms=args.max_wait_ms)
+        rps, p50, p99 = drive(batcher.submit, args.threads, args.duration)
+        stats = batcher.stats()
+        print(f"{evaluator:<10}{'batched':<10}{rps:>10.0f}{p50:>9.2f}{p99:>9.2f}"
+              f"{stats['mean_batch_size']:>12.1f}{stats['queue_delay_ms']['p50']:>14.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+# bench_model_artifact.py
+# Loading the rain model from the pickles (joblib.load of plan_a_model.pkl +
+# plan_a_scaler.pkl) vs the memory-mapped plan_a_model.artifact.
+#
+# Each load runs in a fresh interpreter, as a worker would: time to import
+# what the loader needs, time to load, and the process's USS (private
+# memory) after a first prediction, i.e. what every extra worker costs.
+# Also checks that the artifact gives the same P(rain) as sklearn.
+#
+# Usage: python bench_model_artifact.py [--runs 5]
+
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+from rain_model import BACKEND_DIR
+
+CHILD = r'''
+import os, sys, time, json, warnings
+start = time.perf_counter()
+import numpy as np
+if sys.argv[1] == 'pickle':
+    import joblib
+else:
+    from model_artifact import load_artifact
+imported = time.perf_counter()
+row = np.array([[20.0, 31.0, 70.0, 70.0, 1008.0, 1008.0, 15.0, 15.0, 1.0]])
+if sys.argv[1] == 'pickle':
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        model = joblib.load('plan_a_model.pkl')
+        scaler = joblib.load('plan_a_scaler.pkl')
+    loaded = time.perf_counter()
+    model.predict_proba((row - scaler.mean_) / scaler.scale_)
+else:
+    forest, manifest = load_artifact()
+    loaded = time.perf_counter()
+    forest.rain_probabilities(row)
+uss = 0
+with open('/proc/self/smaps_rollup') as f:
+    for line in f:
+        if line.startswith(('Private_Clean:', 'Private_Dirty:')):
+            uss += int(line.split()[1])
+print(json.dumps({"import_ms": (imported - start) * 1000, "load_ms": (loaded - imported) * 1000, "uss_kb": uss}))
+'''
+
+
+def run_child(mode):
+    out = subprocess.run([sys.executable, '-c', CHILD, mode], cwd=BACKEND_DIR,
+                         capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def check_parity():
+    import warnings
+    import numpy as np
+    import joblib
+    from model_artifact import load_artifact
+    from bench_forest import parity_rows, sklearn_probabilities
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')  # sklearn version mismatch on unpickling
+        model = joblib.load(os.path.join(BACKEND_DIR, 'plan_a_model.pkl'))
+        scaler = joblib.load(os.path.join(BACKEND_DIR, 'plan_a_scaler.pkl'))
+    forest, manifest = load_artifact(verify=True)
+    X = parity_rows(scaler)
+    mismatched = int((np.abs(sklearn_probabilities(model, scaler, X) - forest.rain_probabilities(X)) > 1e-9).sum())
+    print(f"Parity on {len(X):,} rows: {mismatched} rows differ (checksums verified)")
+    return mismatched
+
+
+def main():
+    parser = argparse.ArgumentParser(description='joblib.load vs memory-mapped model artifact')
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    pickle_size = sum(os.path.getsize(os.path.join(BACKEND_DIR, name)) for name in ('plan_a_model.pkl', 'plan_a_scaler.pkl'))
+    artifact_dir = os.path.join(BACKEND_DIR, 'plan_a_model.artifact')
+    artifact_size = sum(os.path.getsize(os.path.join(artifact_dir, name)) for name in os.listdir(artifact_dir))
+    print(f"pickles {pickle_size:,} bytes, artifact {artifact_size:,} bytes; median of {args.runs} fresh processes\n")
+
+    print(f"{'loader':<10}{'import ms':>11}{'load ms':>10}{'USS MB':>9}")
+    for mode in ('pickle', 'artifact'):
+        runs = [run_child(mode) for _ in range(args.runs)]
+        import_ms = statistics.median(r["import_ms"] for r in runs)
+        load_ms = statistics.median(r["load_ms"] for r in runs)
+        uss_mb = statistics.median(r["uss_kb"] for r in runs) / 1024
+        print(f"{mode:<10}{import_ms:>11.1f}{load_ms:>10.2f}{uss_mb:>9.1f}")
+
+    print()
+    if check_parity():
+        print("PARITY CHECK FAILED")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+# bench_model_preload.py
+# Startup time and memory of the 4-worker gunicorn deployment with the app
+# (and the rain model with numpy/scikit-learn) preloaded in the master versus
+# imported separately by every worker (GUNICORN_PRELOAD=0).
+#
+# Startup is the time until every worker has answered a request. Memory is
+# read from /proc/<pid>/smaps_rollup (Linux only) after some /predict calls
+# have run the model in each worker: PSS splits shared pages between the
+# processes sharing them, so its sum is the deployment's real footprint.
+#
+# Usage: python bench_model_preload.py [--requests 40]
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import subprocess
+import requests
+
+from owm_stub import OWMStub, start_stub_in_thread
+from bench_async_predict import BACKEND_DIR, free_port
+
+WORKERS = 4  # gunicorn_config.py
+
+
+def worker_pids(master_pid):
+    with open(f"/proc/{master_pid}/task/{master_pid}/children") as f:
+        return [int(pid) for pid in f.read().split()]
+
+
+def memory_kb(pid):
+    """{'Rss': ..., 'Pss': ..., 'Private': ...} in kB for one process."""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                values[parts[0].rstrip(':')] = int(parts[1])
+    return {'Rss': values['Rss'], 'Pss': values['Pss'],
+            'Private': values['Private_Clean'] + values['Private_Dirty']}
+
+
+def wait_for_workers(base_url, timeout=60):
+    """Polls until WORKERS distinct worker pids have answered."""
+    start = time.perf_counter()
+    seen = set()
+    while len(seen) < WORKERS:
+        if time.perf_counter() - start > timeout:
+            raise RuntimeError(f"Only {len(seen)} workers answered within {timeout}s")
+        try:
+            # A fresh connection each time, so any idle worker may accept it
+            seen.add(requests.get(f"{base_url}/write-behind/stats", timeout=5).json()['pid'])
+        except requests.RequestException:
+            time.sleep(0.05)
+
+
+def run(preload, stub_url, n_requests):
+    workdir = tempfile.mkdtemp(prefix='bench_preload_')
+    port = free_port()
+    env = dict(os.environ,
+               PORT=str(port),
+               GUNICORN_PRELOAD='1' if preload else '0',
+               OWM_BASE_URL=stub_url,
+               DATABASE_URL='sqlite:///' + os.path.join(workdir, 'bench.db'),
+               FORECAST_CACHE_PATH=os.path.join(workdir, 'forecast_cache.db'),
+               # Only for /write-behind/stats, which reports the answering worker's pid
+               WRITE_BEHIND_ENABLED='1')
+    base_url = f"http://127.0.0.1:{port}"
+
+    started = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn_config.py', '--log-level', 'warning',
+                             'app:app'], cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_workers(base_url)
+        boot_seconds = time.perf_counter() - started
+        for i in range(n_requests):
+            response = requests.post(f"{base_url}/predict", json={"city": f"City {i}", "activity": "run"}, timeout=30)
+            response.raise_for_status()
+        time.sleep(0.5)
+        master = memory_kb(proc.pid)
+        workers = [memory_kb(pid) for pid in worker_pids(proc.pid)]
+    finally:
+        proc.terminate()
+        proc.wait()
+    return boot_seconds, master, workers
+
+
+def main():
+    parser = argparse.ArgumentParser(description='gunicorn preload_app startup/memory benchmark')
+    parser.add_argument('--requests', type=int, default=40, help='/predict calls before measuring memory')
+    args = parser.parse_args()
+
+    stub_url = start_stub_in_thread(OWMStub(latency_ms=0), free_port())
+    print(f"{WORKERS} workers, memory after {args.requests} /predict calls (MB)\n")
+    print(f"{'mode':<12}{'startup s':>10}{'total PSS':>11}{'worker RSS':>12}{'worker USS':>12}{'master RSS':>12}")
+    for label, preload in (('per-worker', False), ('preloaded', True)):
+        boot_seconds, master, workers = run(preload, stub_url, args.requests)
+        total_pss = (master['Pss'] + sum(w['Pss'] for w in workers)) / 1024
+        worker_rss = sum(w['Rss'] for w in workers) / len(workers) / 1024
+        worker_uss = sum(w['Private'] for w in workers) / len(workers) / 1024
+        print(f"{label:<12}{boot_seconds:>10.2f}{total_pss:>11.1f}{worker_rss:>12.1f}{worker_uss:>12.1f}"
+              f"{master['Rss'] / 1024:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+# bench_sqlite_concurrency.py
+# Measures write and read throughput on one SQLite file shared by several
+# processes, the way the gunicorn workers share predictions.db locally.
+# Runs twice on fresh scratch databases: once with a plain create_engine()
+# (rollback journal, the old setup) and once with the db_engine.py settings
+# (WAL, synchronous=NORMAL, busy_timeout, cache_size, pool options).
+#
+# Writers insert one prediction per transaction, like /predict; readers fetch
+# the newest /all page.
+#
+# Usage: python bench_sqlite_concurrency.py [--writers 4] [--readers 4] [--duration 10]
+
+import os
+import time
+import random
+import argparse
+import datetime
+import tempfile
+import multiprocessing
+from sqlalchemy import create_engine, select
+from sqlalchemy.exc import OperationalError
+
+from db_engine import engine_options, tune_engine
+from bench_indexes import prediction, metadata, fill
+from load_test import percentile
+
+
+def make_engine(db_url, tuned):
+    if tuned:
+        return tune_engine(create_engine(db_url, **engine_options(db_url)))
+    return create_engine(db_url)
+
+
+def writer(db_url, tuned, deadline, results):
+    engine = make_engine(db_url, tuned)
+    rng = random.Random(os.getpid())
+    latencies, errors = [], 0
+    while time.time() < deadline:
+        start = time.perf_counter()
+        try:
+            with engine.begin() as conn:
+                conn.execute(prediction.insert(), {
+                    'city': f"City {rng.randrange(200)}",
+                    'live_weather': '{"list": []}',
+                    'api_pop': rng.random(),
+                    'timestamp': datetime.datetime.utcnow(),
+                })
+            latencies.append(time.perf_counter() - start)
+        except OperationalError:
+            # "database is locked" once the busy timeout runs out
+            errors += 1
+    results.put(('write', latencies, errors))
+
+
+def reader(db_url, tuned, deadline, results):
+    engine = make_engine(db_url, tuned)
+    query = (select(prediction.c.id, prediction.c.city, prediction.c.timestamp)
+             .order_by(prediction.c.timestamp.desc(), prediction.c.id.desc()).limit(100))
+    latencies, errors = [], 0
+    while time.time() < deadline:
+        start = time.perf_counter()
+        try:
+            with engine.connect() as conn:
+                conn.execute(query).fetchall()
+            latencies.append(time.perf_counter() - start)
+        except OperationalError:
+            errors += 1
+    results.put(('read', latencies, errors))
+
+
+def run(tuned, args):
+    db_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='bench_sqlite_'), 'bench.db')
+    engine = make_engine(db_url, tuned)
+    metadata.create_all(engine)
+    fill(engine, args.rows)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("CREATE INDEX ix_prediction_timestamp_id ON prediction (timestamp, id)")
+    engine.dispose()
+
+    results = multiprocessing.Queue()
+    deadline = time.time() + 1 + args.duration
+    procs = [multiprocessing.Process(target=writer, args=(db_url, tuned, deadline, results))
+             for _ in range(args.writers)]
+    procs += [multiprocessing.Process(target=reader, args=(db_url, tuned, deadline, results))
+              for _ in range(args.readers)]
+    for p in procs:
+        p.start()
+    collected = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+
+    summary = {}
+    for kind in ('write', 'read'):
+        latencies = sorted(l for k, ls, _ in collected if k == kind for l in ls)
+        summary[kind] = {
+            "ops_per_s": len(latencies) / args.duration,
+            "p50_ms": percentile(latencies, 50) * 1000,
+            "p99_ms": percentile(latencies, 99) * 1000,
+            "errors": sum(e for k, _, e in collected if k == kind),
+        }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='SQLite multi-process write/read benchmark')
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=10, help='seconds per run')
+    parser.add_argument('--rows', type=int, default=20000, help='rows to prefill')
+    args = parser.parse_args()
+
+    print(f"{args.writers} writers + {args.readers} readers, {args.duration:.0f}s per run\n")
+    print(f"{'engine':<10}{'op':<7}{'ops/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for label, tuned in (('default', False), ('tuned', True)):
+        summary = run(tuned, args)
+        for kind, r in summary.items():
+            print(f"{label:<10}{kind:<7}{r['ops_per_s']:>10.0f}{r['p50_ms']:>10.2f}{r['p99_ms']:>10.2f}{r['errors']:>8}")
+
+
+if __name__ == '__main__':
+    main()
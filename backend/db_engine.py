@@ -0,0 +1,54 @@
+# db_engine.py
+# SQLAlchemy engine settings for the prediction database.
+#
+# Locally all gunicorn workers share one SQLite file. In its default rollback
+# journal mode a writer locks out every reader, so /predict commits and /all
+# reads queue up behind each other. WAL lets readers carry on during a write,
+# and synchronous=NORMAL (safe with WAL) skips the fsync on every commit.
+# The pragmas are per connection, so they are set in a 'connect' listener.
+
+import os
+from sqlalchemy import event
+
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', '5000'))
+# Negative cache_size is in KiB rather than pages
+SQLITE_CACHE_SIZE_KB = int(os.environ.get('SQLITE_CACHE_SIZE_KB', '20000'))
+SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '5'))
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', '10'))
+# Render's Postgres drops idle connections, so recycle them well before that
+DB_POOL_RECYCLE_SECONDS = int(os.environ.get('DB_POOL_RECYCLE_SECONDS', '300'))
+
+
+def engine_options(db_url):
+    """Keyword arguments for create_engine() / SQLALCHEMY_ENGINE_OPTIONS."""
+    if db_url.startswith('sqlite'):
+        return {
+            "pool_size": DB_POOL_SIZE,
+            "max_overflow": DB_MAX_OVERFLOW,
+            # Seconds pysqlite waits on a locked database; busy_timeout below says the same in ms
+            "connect_args": {"timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+        }
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_recycle": DB_POOL_RECYCLE_SECONDS,
+        "pool_pre_ping": True,
+    }
+
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+    cursor.close()
+
+
+def tune_engine(engine):
+    """Registers the SQLite pragmas on an engine (a no-op for Postgres)."""
+    if engine.dialect.name == 'sqlite':
+        event.listen(engine, 'connect', apply_sqlite_pragmas)
+    return engine
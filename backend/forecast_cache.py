@@ -0,0 +1,239 @@
+# forecast_cache.py
+# A small TTL cache stored in a SQLite file, so all gunicorn workers on the
+# same machine share one copy instead of each keeping its own.
+
+import os
+import json
+import time
+import atexit
+import sqlite3
+import threading
+
+# Reads don't take the write lock: LRU touches and hit/miss counts are kept
+# in memory and written in one short transaction at most every
+# PENDING_FLUSH_SECONDS, skipped (and retried later) if another process
+# holds the lock at that moment.
+PENDING_FLUSH_SECONDS = float(os.environ.get('CACHE_PENDING_FLUSH_SECONDS', '1'))
+PENDING_MAX_KEYS = 256
+
+# OWM forecasts are published in 3-hour blocks (00:00, 03:00, ... UTC)
+FORECAST_BLOCK_SECONDS = 3 * 60 * 60
+
+
+def next_forecast_block_boundary(now=None):
+    """
+    Returns the unix time at which the current 3-hour forecast block ends.
+    A forecast cached now is stale from that moment on.
+    """
+    if now is None:
+        now = time.time()
+    return (int(now // FORECAST_BLOCK_SECONDS) + 1) * FORECAST_BLOCK_SECONDS
+
+
+class SharedTTLCache:
+    """
+    JSON-value cache with per-entry expiry, LRU eviction and hit/miss counters.
+    Several caches can share one file by using different namespaces.
+    Any SQLite error is logged and treated as a miss, so a broken cache never
+    breaks a request.
+    Hit/miss counts and LRU order are written in batches, so stats() can lag
+    behind other processes' lookups by about PENDING_FLUSH_SECONDS.
+    """
+
+    def __init__(self, path, namespace, max_entries=1000):
+        self.path = path
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._pending_lock = threading.Lock()
+        self._reset_pending()
+        self._init_schema()
+        atexit.register(self._flush_pending)
+
+    # --- Connection handling ---
+
+    def _connect(self):
+        # One connection per thread, re-opened after a fork
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _init_schema(self):
+        try:
+            conn = self._connect()
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS cache_entry (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_access REAL NOT NULL,
+                    PRIMARY KEY (namespace, key)
+                )""")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_cache_entry_lru ON cache_entry (namespace, last_access)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS cache_counter (
+                    namespace TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    value INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (namespace, name)
+                )""")
+        except sqlite3.Error as e:
+            print(f"Cache '{self.namespace}' could not be initialised at {self.path}: {e}")
+
+    def _bump(self, conn, name, amount=1):
+        conn.execute(
+            "INSERT INTO cache_counter (namespace, name, value) VALUES (?, ?, ?) "
+            "ON CONFLICT (namespace, name) DO UPDATE SET value = value + excluded.value",
+            (self.namespace, name, amount))
+
+    # --- Buffered read bookkeeping ---
+
+    def _reset_pending(self):
+        self._pending_pid = os.getpid()
+        self._pending_touches = {}
+        self._pending_counts = {}
+        self._last_flush = time.monotonic()
+
+    def _record_lookup(self, key, hit, count_lookup, now):
+        with self._pending_lock:
+            if self._pending_pid != os.getpid():
+                self._reset_pending()  # Don't re-count what the parent process buffered
+            if hit:
+                self._pending_touches[key] = now
+            if count_lookup:
+                name = 'hits' if hit else 'misses'
+                self._pending_counts[name] = self._pending_counts.get(name, 0) + 1
+            due = (time.monotonic() - self._last_flush >= PENDING_FLUSH_SECONDS
+                   or len(self._pending_touches) >= PENDING_MAX_KEYS)
+        if due:
+            self._flush_pending(wait=False)
+
+    def _take_pending(self):
+        with self._pending_lock:
+            touches, counts = self._pending_touches, self._pending_counts
+            self._pending_touches, self._pending_counts = {}, {}
+            self._last_flush = time.monotonic()
+        return touches, counts
+
+    def _restore_pending(self, touches, counts):
+        with self._pending_lock:
+            for key, last_access in touches.items():
+                self._pending_touches[key] = max(last_access, self._pending_touches.get(key, 0))
+            for name, amount in counts.items():
+                self._pending_counts[name] = self._pending_counts.get(name, 0) + amount
+
+    def _apply_pending(self, conn, touches, counts):
+        # Inside a write transaction the caller already holds
+        conn.executemany(
+            "UPDATE cache_entry SET last_access = MAX(last_access, ?) WHERE namespace = ? AND key = ?",
+            [(last_access, self.namespace, key) for key, last_access in touches.items()])
+        for name, amount in counts.items():
+            self._bump(conn, name, amount)
+
+    def _flush_pending(self, wait=True):
+        """
+        Writes the buffered touches and counters. With wait=False it gives up
+        straight away if the database is locked and keeps them for next time.
+        """
+        touches, counts = self._take_pending()
+        if not touches and not counts:
+            return
+        try:
+            conn = self._connect()
+            if not wait:
+                conn.execute('PRAGMA busy_timeout = 0')
+            try:
+                conn.execute('BEGIN IMMEDIATE')
+                try:
+                    self._apply_pending(conn, touches, counts)
+                    conn.execute('COMMIT')
+                except Exception:
+                    conn.execute('ROLLBACK')
+                    raise
+            finally:
+                if not wait:
+                    conn.execute('PRAGMA busy_timeout = 5000')
+        except sqlite3.Error as e:
+            self._restore_pending(touches, counts)
+            if wait:
+                print(f"Cache '{self.namespace}' bookkeeping error: {e}")
+
+    # --- Public API ---
+
+    def get(self, key, count_lookup=True):
+        """
+        Returns the cached value for key, or None if missing/expired.
+        Pass count_lookup=False for a re-check that should not skew hit/miss counters.
+        """
+        now = time.time()
+        try:
+            # Autocommit read: under WAL it never waits for writers
+            row = self._connect().execute(
+                "SELECT value FROM cache_entry WHERE namespace = ? AND key = ? AND expires_at > ?",
+                (self.namespace, key, now)).fetchone()
+        except sqlite3.Error as e:
+            print(f"Cache '{self.namespace}' read error for {key}: {e}")
+            return None
+        self._record_lookup(key, row is not None, count_lookup, now)
+        return json.loads(row[0]) if row is not None else None
+
+    def set(self, key, value, expires_at):
+        """Stores value (any JSON-serialisable object) until expires_at (unix time)."""
+        now = time.time()
+        touches, counts = self._take_pending()
+        try:
+            conn = self._connect()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                # Already holding the lock: write the buffered reads first, so
+                # eviction below sees up-to-date last_access times
+                self._apply_pending(conn, touches, counts)
+                conn.execute(
+                    "INSERT OR REPLACE INTO cache_entry (namespace, key, value, expires_at, last_access) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (self.namespace, key, json.dumps(value), expires_at, now))
+                # Expired entries go first, then least-recently-used ones over the limit
+                conn.execute(
+                    "DELETE FROM cache_entry WHERE namespace = ? AND expires_at <= ?",
+                    (self.namespace, now))
+                (count,) = conn.execute(
+                    "SELECT COUNT(*) FROM cache_entry WHERE namespace = ?",
+                    (self.namespace,)).fetchone()
+                if count > self.max_entries:
+                    overflow = count - self.max_entries
+                    conn.execute(
+                        "DELETE FROM cache_entry WHERE namespace = ? AND key IN ("
+                        "SELECT key FROM cache_entry WHERE namespace = ? ORDER BY last_access LIMIT ?)",
+                        (self.namespace, self.namespace, overflow))
+                    self._bump(conn, 'evictions', overflow)
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        except sqlite3.Error as e:
+            self._restore_pending(touches, counts)
+            print(f"Cache '{self.namespace}' write error for {key}: {e}")
+
+    def stats(self):
+        """Returns hit/miss/eviction counters and the current entry count."""
+        stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'entries': 0}
+        self._flush_pending()
+        try:
+            conn = self._connect()
+            for name, value in conn.execute(
+                    "SELECT name, value FROM cache_counter WHERE namespace = ?", (self.namespace,)):
+                stats[name] = value
+            (stats['entries'],) = conn.execute(
+                "SELECT COUNT(*) FROM cache_entry WHERE namespace = ? AND expires_at > ?",
+                (self.namespace, time.time())).fetchone()
+        except sqlite3.Error as e:
+            print(f"Cache '{self.namespace}' stats error: {e}")
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else None
+        return stats
@@ -0,0 +1,110 @@
+# forest_arrays.py
+# The rain model's RandomForest flattened into a handful of contiguous NumPy
+# arrays, plus an evaluator that walks all trees for a whole batch at once.
+#
+# sklearn's predict_proba pays a fixed cost on every call (input validation,
+# joblib dispatch over the 100 trees), which dominates for the one-row calls
+# /predict makes. Here a batch is one loop of max_depth vectorized steps.
+#
+# Layout: the nodes of every tree are concatenated, so node i is
+#   feature[i], threshold[i]  the split: go left when x[feature] <= threshold
+#   children[i]               global indices of the [left, right] children
+#   value[i]                  P(rain) at that node (only read at leaves)
+# and roots[t] is the first node of tree t. Leaves point both children at
+# themselves, so a row that reaches a leaf early just stays there.
+#
+# The StandardScaler is folded into the thresholds: (x - mean) / scale <= t
+# is x <= t * scale + mean, so raw (unscaled) features go straight in.
+# sklearn compares float32(scaled x) against t, so the folded threshold is
+# taken at the float32 rounding boundary above t, which keeps every split
+# decision identical to sklearn's.
+
+import numpy as np
+
+ARRAY_NAMES = ('feature', 'threshold', 'children', 'value', 'roots')
+
+# Rows walked together: keeps the (rows x trees) working arrays in cache
+CHUNK_ROWS = 512
+
+
+class FlatForest:
+    """Array-backed forest evaluator; see the module comment for the layout."""
+
+    def __init__(self, feature, threshold, children, value, roots, max_depth):
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.value = value
+        self.roots = roots
+        self.max_depth = int(max_depth)
+
+    def arrays(self):
+        return {name: getattr(self, name) for name in ARRAY_NAMES}
+
+    def rain_probabilities(self, X):
+        """Mean leaf P(rain) over all trees for each row of raw features X (n_rows x n_features)."""
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        n_rows, n_features = X.shape
+        children = self.children.reshape(-1)
+        probabilities = np.empty(n_rows)
+        for start in range(0, n_rows, CHUNK_ROWS):
+            chunk = X[start:start + CHUNK_ROWS]
+            flat_chunk = chunk.reshape(-1)
+            # Offset of each row's first feature in flat_chunk, one column per tree
+            row_offsets = (np.arange(chunk.shape[0]) * n_features)[:, None]
+            nodes = np.tile(self.roots, (chunk.shape[0], 1))
+            for _ in range(self.max_depth):
+                go_right = flat_chunk[row_offsets + self.feature[nodes]] > self.threshold[nodes]
+                nodes = children[nodes * 2 + go_right]
+            probabilities[start:start + CHUNK_ROWS] = self.value[nodes].mean(axis=1)
+        return probabilities
+
+
+def export_forest(model, scaler=None, positive_class=1):
+    """Flattens a fitted RandomForestClassifier (and optional StandardScaler) into a FlatForest."""
+    class_index = list(model.classes_).index(positive_class)
+    mean = scaler.mean_ if scaler is not None else None
+    scale = scaler.scale_ if scaler is not None else None
+
+    features, thresholds, children, values, roots = [], [], [], [], []
+    offset = 0
+    max_depth = 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        node_ids = np.arange(tree.node_count)
+        is_leaf = tree.children_left == -1
+
+        feature = np.where(is_leaf, 0, tree.feature)
+        threshold = tree.threshold.astype(np.float64)
+        if scaler is not None:
+            # Largest float32 <= t, then the midpoint to the next float32: every
+            # scaled value below it rounds to a float32 <= t in sklearn
+            lower = threshold.astype(np.float32)
+            lower = np.where(lower.astype(np.float64) > threshold, np.nextafter(lower, np.float32(-np.inf)), lower)
+            upper = np.nextafter(lower, np.float32(np.inf))
+            boundary = (lower.astype(np.float64) + upper.astype(np.float64)) / 2
+            threshold = boundary * scale[feature] + mean[feature]
+        # Leaves compare against +inf and loop back to themselves either way
+        threshold = np.where(is_leaf, np.inf, threshold)
+        left = np.where(is_leaf, node_ids, tree.children_left) + offset
+        right = np.where(is_leaf, node_ids, tree.children_right) + offset
+        # Normalised per node (older sklearn versions store raw class counts)
+        counts = tree.value[:, 0, :]
+        value = counts[:, class_index] / counts.sum(axis=1)
+
+        features.append(feature)
+        thresholds.append(threshold)
+        children.append(np.stack([left, right], axis=1))
+        values.append(value)
+        roots.append(offset)
+        offset += tree.node_count
+        max_depth = max(max_depth, tree.max_depth)
+
+    return FlatForest(
+        feature=np.ascontiguousarray(np.concatenate(features), dtype=np.intp),
+        threshold=np.ascontiguousarray(np.concatenate(thresholds), dtype=np.float64),
+        children=np.ascontiguousarray(np.concatenate(children), dtype=np.intp),
+        value=np.ascontiguousarray(np.concatenate(values), dtype=np.float64),
+        roots=np.asarray(roots, dtype=np.intp),
+        max_depth=max_depth,
+    )
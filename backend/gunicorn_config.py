@@ -3,10 +3,50 @@
 
 # Use the PORT environment variable Render gives us, or default to 10000
 import os
+import sys
+import subprocess
 port = os.environ.get('PORT', '10000')
 
 # Bind to 0.0.0.0 to accept connections from anywhere
 bind = f'0.0.0.0:{port}'
 
 # Number of workers to run
-workers = 4
\ No newline at end of file
+workers = 4
+# Threads per worker; above 1 gunicorn switches to the gthread worker, which
+# lets INFERENCE_BATCHING_ENABLED batch model calls across requests
+threads = int(os.environ.get('GUNICORN_THREADS', '1'))
+
+# Import the app (and load the rain model) once in the master; the forked
+# workers then share those memory pages copy-on-write.
+# GUNICORN_PRELOAD=0 goes back to every worker importing the app itself.
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+
+# Create tables and apply schema migrations once, in the master process,
+# before any worker starts serving requests
+def on_starting(server):
+    if not preload_app:
+        # Importing the app here would preload it anyway: migrate in a child process
+        subprocess.run([sys.executable, '-c', 'from app import migrate_database; migrate_database()'],
+                       cwd=os.path.dirname(os.path.abspath(__file__)), check=True)
+        return
+    from app import app, db, migrate_database
+    migrate_database()
+    # Don't hand the master's open DB connections down to the forked workers
+    with app.app_context():
+        db.engine.dispose()
+
+
+# A preloaded app's engine came from the master: give each worker its own
+# pool without closing the master's connections underneath it
+def post_fork(server, worker):
+    if not preload_app:
+        return
+    from app import app, db
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+
+# Commit any predictions still sitting in this worker's write-behind queue
+def worker_exit(server, worker):
+    from app import shutdown_write_behind
+    shutdown_write_behind()
@@ -0,0 +1,121 @@
+# load_test.py
+# Drives /predict and /all at a fixed concurrency and reports throughput,
+# p50/p95/p99 latency and, when pointed at owm_stub.py, how many upstream
+# OWM calls each request cost.
+#
+# Usage (three terminals):
+#   python owm_stub.py --port 8900 --latency-ms 80
+#   OWM_BASE_URL=http://127.0.0.1:8900/data/2.5 gunicorn -c gunicorn_config.py app:app
+#   python load_test.py --target http://127.0.0.1:10000 --stub http://127.0.0.1:8900 \
+#       --endpoints predict,all --concurrency 16 --duration 20
+
+import time
+import random
+import asyncio
+import argparse
+import aiohttp
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return float('nan')
+    rank = max(int(round(pct / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def make_request_factory(endpoint, args):
+    cities = [f"City {i}" for i in range(args.cities)]
+
+    def predict_request():
+        body = {"city": random.choice(cities), "activity": args.activity, "scout_mode": args.scout_mode}
+        return 'POST', f"{args.target}/predict", body
+
+    def all_request():
+        return 'GET', f"{args.target}/all{args.all_query}", None
+
+    return {'predict': predict_request, 'all': all_request}[endpoint]
+
+
+async def read_stub_counts(session, stub_url):
+    if not stub_url:
+        return None
+    async with session.get(f"{stub_url}/__stats") as response:
+        counts = await response.json()
+    return counts['forecast'] + counts['find']
+
+
+async def run_endpoint(endpoint, args):
+    make_request = make_request_factory(endpoint, args)
+    latencies = []
+    status_counts = {}
+    deadline = time.perf_counter() + args.duration
+
+    async def client(session):
+        while time.perf_counter() < deadline:
+            method, url, body = make_request()
+            start = time.perf_counter()
+            try:
+                async with session.request(method, url, json=body) as response:
+                    await response.read()
+                    status = response.status
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                status = 'conn-error'
+            latencies.append(time.perf_counter() - start)
+            status_counts[status] = status_counts.get(status, 0) + 1
+
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+    timeout = aiohttp.ClientTimeout(total=args.timeout)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        upstream_before = await read_stub_counts(session, args.stub)
+        started = time.perf_counter()
+        await asyncio.gather(*(client(session) for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+        upstream_after = await read_stub_counts(session, args.stub)
+
+    latencies.sort()
+    total = len(latencies)
+    ok = sum(count for status, count in status_counts.items() if status in (200, 201))
+    result = {
+        "endpoint": endpoint,
+        "requests": total,
+        "ok": ok,
+        "statuses": status_counts,
+        "rps": total / elapsed if elapsed else 0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "upstream_per_request": None
+    }
+    if upstream_before is not None and total:
+        result["upstream_per_request"] = (upstream_after - upstream_before) / total
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test for /predict and /all')
+    parser.add_argument('--target', default='http://127.0.0.1:5000', help='backend base URL')
+    parser.add_argument('--stub', default=None, help='owm_stub.py base URL, for upstream call counts')
+    parser.add_argument('--endpoints', default='predict,all', help='comma-separated: predict, all')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=15, help='seconds per endpoint')
+    parser.add_argument('--timeout', type=float, default=60, help='per-request timeout in seconds')
+    parser.add_argument('--cities', type=int, default=50, help='distinct anchor cities to pick from')
+    parser.add_argument('--activity', default='run')
+    parser.add_argument('--scout-mode', default='full')
+    parser.add_argument('--all-query', default='', help="query string for /all, e.g. '?limit=50'")
+    args = parser.parse_args()
+    args.target = args.target.rstrip('/')
+
+    print(f"{'endpoint':<10}{'requests':>9}{'ok':>7}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'upstream/req':>14}")
+    for endpoint in [e.strip() for e in args.endpoints.split(',') if e.strip()]:
+        r = asyncio.run(run_endpoint(endpoint, args))
+        upstream = '-' if r['upstream_per_request'] is None else f"{r['upstream_per_request']:.2f}"
+        print(f"{r['endpoint']:<10}{r['requests']:>9}{r['ok']:>7}{r['rps']:>9.1f}"
+              f"{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}{r['p99_ms']:>9.1f}{upstream:>14}")
+        if set(r['statuses']) - {200, 201}:
+            print(f"{'':<10}statuses: {r['statuses']}")
+
+
+if __name__ == '__main__':
+    main()
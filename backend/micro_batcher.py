@@ -0,0 +1,123 @@
+# micro_batcher.py
+# Collects single-row inference calls from concurrent requests (threads) into
+# one batched model call.
+#
+# The first row to arrive opens a batch; the batch is run as soon as it has
+# max_batch rows or max_wait_ms has passed since it opened, whichever comes
+# first. Each caller blocks in submit() until its own result is back.
+# A single-threaded worker gains nothing from this (there is never a second
+# row to wait for), so it only pays off with gthread workers
+# (GUNICORN_THREADS) or the aiohttp app.
+
+import os
+import time
+import queue
+import threading
+from collections import deque
+
+
+class _Pending:
+    __slots__ = ('row', 'enqueued_at', 'done', 'result', 'error')
+
+    def __init__(self, row):
+        self.row = row
+        self.enqueued_at = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class MicroBatcher:
+    """
+    Runs predict_batch(rows) -> results (one per row, in order) on batches of
+    concurrent submit(row) calls. stats() reports the batch size
+    distribution and the queueing delay each row picked up before its batch
+    started.
+    """
+
+    def __init__(self, predict_batch, max_batch=64, max_wait_ms=2.0, recent_delays=1000):
+        self.predict_batch = predict_batch
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self.batch_sizes = {}
+        self.rows = 0
+        self.errors = 0
+        self._delays = deque(maxlen=recent_delays)
+
+    def submit(self, row, timeout=10.0):
+        """Queues one row and waits for its result. Re-raises the batch's error, if any."""
+        self._ensure_started()
+        pending = _Pending(row)
+        self._queue.put(pending)
+        if not pending.done.wait(timeout):
+            raise TimeoutError(f"No inference result after {timeout}s")
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _ensure_started(self):
+        # One batching thread per process, started lazily (and again after a fork)
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._queue = queue.Queue()
+                self._thread = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+                self._thread.start()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            try:
+                results = self.predict_batch([pending.row for pending in batch])
+                for pending, result in zip(batch, results):
+                    pending.result = result
+            except Exception as e:
+                self.errors += 1
+                for pending in batch:
+                    pending.error = e
+            self._record(batch, started)
+            for pending in batch:
+                pending.done.set()
+
+    def _record(self, batch, started):
+        size = len(batch)
+        self.batch_sizes[size] = self.batch_sizes.get(size, 0) + 1
+        self.rows += size
+        self._delays.extend(started - pending.enqueued_at for pending in batch)
+
+    def stats(self):
+        delays = sorted(self._delays)
+        batches = sum(self.batch_sizes.values())
+
+        def delay_ms(pct):
+            if not delays:
+                return None
+            return delays[min(int(pct / 100 * len(delays)), len(delays) - 1)] * 1000
+
+        return {
+            "rows": self.rows,
+            "batches": batches,
+            "errors": self.errors,
+            "mean_batch_size": self.rows / batches if batches else None,
+            "batch_sizes": {str(size): count for size, count in sorted(self.batch_sizes.items())},
+            "queue_delay_ms": {"p50": delay_ms(50), "p95": delay_ms(95), "p99": delay_ms(99),
+                               "max": delays[-1] * 1000 if delays else None},
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000,
+        }
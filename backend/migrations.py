@@ -0,0 +1,113 @@
+# migrations.py
+# Versioned schema changes for the prediction database.
+# Works on both the local SQLite file and the Postgres DATABASE_URL deployment.
+# Every migration is idempotent (a fresh database already gets the latest
+# schema from db.create_all()) and runs at most once: the highest applied
+# version is recorded in the schema_version table.
+#
+# Run with:  flask --app app migrate
+# (python app.py and gunicorn's on_starting hook run it automatically)
+
+from sqlalchemy import text, inspect, LargeBinary, MetaData, Table, Column, String, Integer, DateTime
+
+import rollups
+
+
+def create_index_if_missing(conn, name, table, columns_sql):
+    # CREATE INDEX IF NOT EXISTS and expression indexes such as lower(city)
+    # are supported by both SQLite (3.9+) and Postgres (9.5+)
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns_sql})"))
+
+
+def add_column_if_missing(conn, table, column, column_sql):
+    existing = {c['name'] for c in inspect(conn).get_columns(table)}
+    if column not in existing:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {column_sql}"))
+
+
+# --- Migrations (version, description, function) ---
+
+def add_prediction_indexes(conn):
+    # (timestamp, id) serves ORDER BY timestamp plus the /all keyset tie-break
+    create_index_if_missing(conn, 'ix_prediction_timestamp_id', 'prediction', 'timestamp, id')
+    create_index_if_missing(conn, 'ix_prediction_city_timestamp', 'prediction', 'city, timestamp')
+    # Case-insensitive city lookups: WHERE lower(city) = ... ORDER BY timestamp
+    create_index_if_missing(conn, 'ix_prediction_city_lower_timestamp', 'prediction', 'lower(city), timestamp, id')
+
+
+def add_compressed_payload_column(conn):
+    # BLOB on SQLite, BYTEA on Postgres
+    blob_type = LargeBinary().compile(dialect=conn.dialect)
+    add_column_if_missing(conn, 'prediction', 'live_weather_z', blob_type)
+
+
+def add_rollup_tables(conn):
+    # create_all skips tables that already exist
+    rollups.metadata.create_all(conn)
+
+
+def add_payload_table(conn):
+    # Snapshot of app.WeatherPayload as of this migration
+    weather_payload = Table(
+        'weather_payload', MetaData(),
+        Column('hash', String(64), primary_key=True),
+        Column('data_z', LargeBinary, nullable=False),
+        Column('raw_size', Integer, nullable=False),
+        Column('created_at', DateTime),
+    )
+    weather_payload.create(conn, checkfirst=True)
+    add_column_if_missing(conn, 'prediction', 'payload_hash', 'VARCHAR(64)')
+    create_index_if_missing(conn, 'ix_prediction_payload_hash', 'prediction', 'payload_hash')
+
+
+def add_payload_last_used(conn):
+    add_column_if_missing(conn, 'weather_payload', 'last_used_at', DateTime().compile(dialect=conn.dialect))
+
+
+def add_rollup_value_counts(conn):
+    for name in ('pop', 'humidity', 'rain_mm'):
+        add_column_if_missing(conn, 'prediction_rollup', f'{name}_count', 'INTEGER')
+        # Existing rows only know whether any value was there: a NULL sum means
+        # none were, otherwise assume all were (what the old means divided by)
+        conn.execute(text(
+            f"UPDATE prediction_rollup SET {name}_count = "
+            f"CASE WHEN {name}_sum IS NULL THEN 0 ELSE row_count END WHERE {name}_count IS NULL"))
+
+
+MIGRATIONS = [
+    (1, "Indexes on prediction timestamp and city", add_prediction_indexes),
+    (2, "Compressed live_weather_z payload column", add_compressed_payload_column),
+    (3, "Hourly/daily prediction_rollup and rollup_state tables", add_rollup_tables),
+    (4, "Content-addressed weather_payload table and prediction.payload_hash", add_payload_table),
+    (5, "weather_payload.last_used_at for the orphan-sweep grace period", add_payload_last_used),
+    (6, "Non-NULL value counts on prediction_rollup", add_rollup_value_counts),
+]
+
+
+def get_current_version(conn):
+    conn.execute(text("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)"))
+    version = conn.execute(text("SELECT MAX(version) FROM schema_version")).scalar()
+    return version or 0
+
+
+def upgrade(engine):
+    """
+    Applies every migration newer than the database's schema_version, each in
+    its own transaction. Returns the list of versions applied.
+    """
+    with engine.begin() as conn:
+        current = get_current_version(conn)
+
+    applied = []
+    for version, description, migrate in MIGRATIONS:
+        if version <= current:
+            continue
+        print(f"Applying migration {version}: {description}...")
+        with engine.begin() as conn:
+            migrate(conn)
+            conn.execute(text("INSERT INTO schema_version (version) VALUES (:version)"), {"version": version})
+        applied.append(version)
+
+    if applied:
+        print(f"Database schema upgraded to version {applied[-1]}")
+    return applied
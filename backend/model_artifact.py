@@ -0,0 +1,139 @@
+# model_artifact.py
+# A pickle-free, memory-mappable format for the rain model.
+#
+# An artifact is a directory holding the forest_arrays.FlatForest arrays as
+# plain .npy files plus manifest.json (feature order, scaler parameters,
+# array dtypes/shapes/checksums and where the model came from).
+# load_artifact() maps the .npy files read-only with np.load(mmap_mode='r'),
+# so loading takes milliseconds, needs neither scikit-learn nor unpickling,
+# and every worker reads the same page-cache pages instead of holding a
+# private unpickled copy.
+#
+# Build it from the pickles (train_model.py does this after training):
+#   python model_artifact.py [--model plan_a_model.pkl] [--scaler plan_a_scaler.pkl] [--out plan_a_model.artifact]
+
+import os
+import json
+import hashlib
+import argparse
+import datetime
+import numpy as np
+
+from forest_arrays import FlatForest, ARRAY_NAMES
+
+FORMAT_VERSION = 1
+MANIFEST_NAME = 'manifest.json'
+BACKEND_DIR = os.path.abspath(os.path.dirname(__file__))
+DEFAULT_ARTIFACT_DIR = os.path.join(BACKEND_DIR, 'plan_a_model.artifact')
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def pickle_source(model_path, scaler_path):
+    """The manifest's "source" block: which pickles an artifact was exported from."""
+    return {"model": os.path.basename(model_path), "model_sha256": file_sha256(model_path),
+            "scaler": os.path.basename(scaler_path), "scaler_sha256": file_sha256(scaler_path)}
+
+
+def stale_sources(manifest, model_path, scaler_path):
+    """
+    Names of the pickles that exist but no longer match the checksums the
+    artifact was exported from (i.e. they were retrained or replaced since).
+    A missing pickle doesn't count: the artifact may be deployed on its own.
+    """
+    source = manifest.get("source") or {}
+    stale = []
+    for key, path in (("model", model_path), ("scaler", scaler_path)):
+        if os.path.exists(path) and source.get(f"{key}_sha256") != file_sha256(path):
+            stale.append(os.path.basename(path))
+    return stale
+
+
+def save_artifact(forest, features, scaler, out_dir, source=None):
+    """Writes a FlatForest (scaler already folded in) and its manifest to out_dir."""
+    os.makedirs(out_dir, exist_ok=True)
+    arrays = {}
+    for name, array in forest.arrays().items():
+        file_name = f"{name}.npy"
+        path = os.path.join(out_dir, file_name)
+        np.save(path, np.ascontiguousarray(array))
+        arrays[name] = {"file": file_name, "dtype": str(array.dtype), "shape": list(array.shape),
+                        "sha256": file_sha256(path)}
+
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "kind": "random_forest_rain_probability",
+        "features": list(features),
+        # Already folded into the thresholds; kept so the inputs can be checked/explained
+        "scaler": {"mean": scaler.mean_.tolist(), "scale": scaler.scale_.tolist()},
+        "scaler_folded": True,
+        "n_trees": int(len(forest.roots)),
+        "n_nodes": int(len(forest.feature)),
+        "max_depth": forest.max_depth,
+        "arrays": arrays,
+        "source": source or {},
+        "created_at": datetime.datetime.utcnow().isoformat(),
+    }
+    # Manifest last: a directory without one is an incomplete export
+    with open(os.path.join(out_dir, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def load_artifact(artifact_dir=DEFAULT_ARTIFACT_DIR, verify=False):
+    """
+    Returns (FlatForest, manifest) with the arrays memory-mapped read-only.
+    verify=True also checks every file against its manifest checksum
+    (which reads the files, so it costs most of the mmap speed-up).
+    """
+    with open(os.path.join(artifact_dir, MANIFEST_NAME)) as f:
+        manifest = json.load(f)
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported model artifact format {manifest.get('format_version')!r}")
+
+    arrays = {}
+    for name in ARRAY_NAMES:
+        spec = manifest["arrays"][name]
+        path = os.path.join(artifact_dir, spec["file"])
+        if verify and file_sha256(path) != spec["sha256"]:
+            raise ValueError(f"{path} does not match its manifest checksum")
+        array = np.load(path, mmap_mode='r')
+        if str(array.dtype) != spec["dtype"] or list(array.shape) != spec["shape"]:
+            raise ValueError(f"{path} is {array.dtype}{array.shape}, manifest says {spec['dtype']}{spec['shape']}")
+        arrays[name] = array
+    return FlatForest(max_depth=manifest["max_depth"], **arrays), manifest
+
+
+def main():
+    import warnings
+    import joblib
+    from forest_arrays import export_forest
+    from rain_model import FEATURES
+
+    parser = argparse.ArgumentParser(description='Export the rain model pickles as a memory-mappable artifact')
+    parser.add_argument('--model', default=os.path.join(BACKEND_DIR, 'plan_a_model.pkl'))
+    parser.add_argument('--scaler', default=os.path.join(BACKEND_DIR, 'plan_a_scaler.pkl'))
+    parser.add_argument('--out', default=DEFAULT_ARTIFACT_DIR)
+    args = parser.parse_args()
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')  # sklearn version mismatch on unpickling
+        model = joblib.load(args.model)
+        scaler = joblib.load(args.scaler)
+    if list(getattr(scaler, 'feature_names_in_', FEATURES)) != list(FEATURES):
+        raise SystemExit(f"Scaler feature order {list(scaler.feature_names_in_)} != {list(FEATURES)}")
+
+    forest = export_forest(model, scaler)
+    manifest = save_artifact(forest, FEATURES, scaler, args.out, pickle_source(args.model, args.scaler))
+    size = sum(os.path.getsize(os.path.join(args.out, spec["file"])) for spec in manifest["arrays"].values())
+    print(f"Wrote {manifest['n_trees']} trees / {manifest['n_nodes']:,} nodes ({size:,} bytes of arrays) to {args.out}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+# owm_client.py
+# Shared HTTP client for all OpenWeatherMap calls.
+# Each gunicorn worker keeps one pooled keep-alive Session, so repeated
+# calls reuse the same TCP+TLS connection instead of paying a new handshake.
+
+import os
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# --- Configuration (override with environment variables) ---
+CONNECT_TIMEOUT = float(os.environ.get('OWM_CONNECT_TIMEOUT', '3.05'))
+READ_TIMEOUT = float(os.environ.get('OWM_READ_TIMEOUT', '10'))
+MAX_RETRIES = int(os.environ.get('OWM_MAX_RETRIES', '2'))
+BACKOFF_FACTOR = float(os.environ.get('OWM_BACKOFF_FACTOR', '0.3'))
+POOL_SIZE = int(os.environ.get('OWM_POOL_SIZE', '10'))
+# Longest Retry-After we honour per retry; a request waits at most
+# MAX_RETRIES * MAX_RETRY_AFTER seconds for retries on top of its timeouts
+MAX_RETRY_AFTER = float(os.environ.get('OWM_MAX_RETRY_AFTER', '2'))
+
+# Retry only on errors that are worth retrying (rate limits and server errors)
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_session = None
+_session_pid = None
+
+
+class CappedRetry(Retry):
+    """
+    Retry that honours Retry-After but never sleeps longer than
+    MAX_RETRY_AFTER, so a 429 with a long Retry-After can't pin a worker.
+    """
+
+    def get_retry_after(self, response):
+        retry_after = super().get_retry_after(response)
+        if retry_after is None:
+            return None
+        return min(retry_after, MAX_RETRY_AFTER)
+
+
+def _build_session():
+    retry = CappedRetry(
+        total=MAX_RETRIES,
+        connect=MAX_RETRIES,
+        read=MAX_RETRIES,
+        status=MAX_RETRIES,
+        backoff_factor=BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(['GET']),
+        respect_retry_after_header=True,
+        raise_on_status=False  # Hand the last response back so callers can log it
+    )
+    adapter = HTTPAdapter(pool_connections=2, pool_maxsize=POOL_SIZE, max_retries=retry)
+
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update({
+        'Accept': 'application/json',
+        'Accept-Encoding': 'gzip, deflate',
+        'Connection': 'keep-alive'
+    })
+    return session
+
+
+def get_session():
+    """
+    Returns this process's shared Session.
+    Sockets must not be shared between forked workers, so a new Session is
+    built the first time it is used in each process.
+    """
+    global _session, _session_pid
+    if _session is None or _session_pid != os.getpid():
+        _session = _build_session()
+        _session_pid = os.getpid()
+    return _session
+
+
+def owm_get(url, params):
+    """
+    GET an OpenWeatherMap endpoint through the pooled Session with
+    connect/read timeouts and the retry budget above.
+    Raises requests.exceptions.RequestException on network failure.
+    """
+    return get_session().get(url, params=params, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
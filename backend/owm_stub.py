@@ -0,0 +1,158 @@
+# owm_stub.py
+# Local stand-in for the two OpenWeatherMap endpoints the backend uses
+# (/data/2.5/forecast and /data/2.5/find), for offline benchmarks.
+# Latency, error rate and payload size are configurable, and every call is
+# counted so load tests can report upstream calls per request.
+#
+# Usage:
+#   python owm_stub.py --port 8900 --latency-ms 80 --error-rate 0.01
+#   OWM_BASE_URL=http://127.0.0.1:8900/data/2.5 gunicorn -c gunicorn_config.py app:app
+#
+# GET /__stats returns the call counters, POST /__stats/reset zeroes them.
+
+import random
+import asyncio
+import argparse
+import threading
+import zlib
+from aiohttp import web
+
+BASE_PATH = '/data/2.5'
+
+
+def city_coord(city_name):
+    """Deterministic, roughly India-shaped coordinates for any city name."""
+    h = zlib.crc32(city_name.strip().lower().encode('utf-8'))
+    return {"lat": round(8 + (h % 2800) / 100, 4), "lon": round(68 + (h // 2800 % 2800) / 100, 4)}
+
+
+def make_block(rng, pad_bytes):
+    feels_like = round(rng.uniform(5, 40), 2)
+    block = {
+        "dt": 1700000000,
+        "main": {
+            "temp": round(feels_like - 1, 2), "feels_like": feels_like,
+            "temp_min": round(feels_like - 3, 2), "temp_max": round(feels_like + 1, 2),
+            "pressure": rng.randint(995, 1020), "humidity": rng.randint(30, 98)
+        },
+        "weather": [{"id": 500, "main": "Rain", "description": "light rain", "icon": "10d"}],
+        "wind": {"speed": round(rng.uniform(0, 12), 2), "deg": rng.randint(0, 359)},
+        "pop": round(rng.random(), 2),
+        "rain": {"3h": rng.choice([0, 0, 0, round(rng.uniform(0.1, 15), 2)])},
+        "dt_txt": "2023-11-14 22:00:00"
+    }
+    if pad_bytes:
+        block["_padding"] = "x" * pad_bytes
+    return block
+
+
+class OWMStub:
+    def __init__(self, latency_ms=50, jitter_ms=0, error_rate=0.0, blocks=None, pad_bytes=0, seed=0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.blocks = blocks  # None = honour the request's cnt
+        self.pad_bytes = pad_bytes
+        self.rng = random.Random(seed)
+        self.counts = {"forecast": 0, "find": 0, "errors": 0}
+
+    async def _delay_or_fail(self):
+        """Sleeps for the configured latency; returns an error response if this call should fail."""
+        delay_ms = self.latency_ms + self.rng.uniform(-self.jitter_ms, self.jitter_ms)
+        await asyncio.sleep(max(delay_ms, 0) / 1000)
+        if self.error_rate and self.rng.random() < self.error_rate:
+            self.counts["errors"] += 1
+            return web.json_response({"cod": 503, "message": "stub: injected failure"}, status=503)
+        return None
+
+    async def forecast(self, request):
+        self.counts["forecast"] += 1
+        error = await self._delay_or_fail()
+        if error is not None:
+            return error
+        city = request.query.get('q', 'Stubville')
+        n_blocks = self.blocks or int(request.query.get('cnt', 40))
+        rng = random.Random(city.lower())
+        return web.json_response({
+            "cod": "200",
+            "cnt": n_blocks,
+            "list": [make_block(rng, self.pad_bytes) for _ in range(n_blocks)],
+            "city": {"name": city, "coord": city_coord(city), "country": "IN", "timezone": 19800}
+        })
+
+    async def find(self, request):
+        self.counts["find"] += 1
+        error = await self._delay_or_fail()
+        if error is not None:
+            return error
+        lat = float(request.query.get('lat', 0))
+        lon = float(request.query.get('lon', 0))
+        cnt = int(request.query.get('cnt', 6))
+        rng = random.Random(f"{lat:.1f}:{lon:.1f}")
+        items = []
+        for i in range(cnt):
+            block = make_block(rng, self.pad_bytes)
+            rain = block['rain']['3h']
+            items.append({
+                "name": f"Near {lat:.1f},{lon:.1f} #{i}",
+                "coord": {"lat": lat, "lon": lon},
+                "main": block['main'],
+                "wind": block['wind'],
+                "rain": {"1h": rain} if rain else None,
+                "weather": block['weather']
+            })
+        return web.json_response({"message": "accurate", "cod": "200", "count": cnt, "list": items})
+
+    async def stats(self, request):
+        return web.json_response(self.counts)
+
+    async def reset(self, request):
+        for key in self.counts:
+            self.counts[key] = 0
+        return web.json_response(self.counts)
+
+    def make_app(self):
+        stub_app = web.Application()
+        stub_app.router.add_get(f'{BASE_PATH}/forecast', self.forecast)
+        stub_app.router.add_get(f'{BASE_PATH}/find', self.find)
+        stub_app.router.add_get('/__stats', self.stats)
+        stub_app.router.add_post('/__stats/reset', self.reset)
+        return stub_app
+
+
+def start_stub_in_thread(stub, port, host='127.0.0.1'):
+    """
+    Runs the stub on its own event loop in a daemon thread.
+    Returns the OWM_BASE_URL to point the backend at.
+    """
+    ready = threading.Event()
+
+    def run():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        runner = web.AppRunner(stub.make_app(), access_log=None)
+        loop.run_until_complete(runner.setup())
+        loop.run_until_complete(web.TCPSite(runner, host, port).start())
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, daemon=True).start()
+    ready.wait()
+    return f"http://{host}:{port}{BASE_PATH}"
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local OpenWeatherMap stand-in')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--latency-ms', type=float, default=50)
+    parser.add_argument('--jitter-ms', type=float, default=0)
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of calls answered with HTTP 503')
+    parser.add_argument('--blocks', type=int, default=None, help='forecast blocks per response (default: the cnt asked for)')
+    parser.add_argument('--pad-bytes', type=int, default=0, help='filler bytes added to every block')
+    args = parser.parse_args()
+
+    stub = OWMStub(args.latency_ms, args.jitter_ms, args.error_rate, args.blocks, args.pad_bytes)
+    print(f"OWM stub on http://{args.host}:{args.port}{BASE_PATH} "
+          f"(latency {args.latency_ms}ms +/- {args.jitter_ms}ms, error rate {args.error_rate})")
+    web.run_app(stub.make_app(), host=args.host, port=args.port, access_log=None, print=None)
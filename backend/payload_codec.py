@@ -0,0 +1,139 @@
+# payload_codec.py
+# Compression for the stored OWM forecast payloads (Prediction.live_weather_z).
+#
+# Every blob starts with a one-byte codec tag, so rows written with different
+# settings can always be read back:
+#   b'z'              zlib
+#   b'd' + dict id    zlib with a preset dictionary
+#   b's'              zstd
+#   b'S' + dict id    zstd with a trained dictionary
+# The dict id is the CRC32 of the dictionary (4 bytes, big-endian), and the
+# dictionary itself is read from PAYLOAD_DICT_DIR/<id>.dict. Dictionaries are
+# created with `flask --app app train-payload-dictionary` and must be kept
+# (committed) for as long as rows compressed with them exist.
+#
+# zstd needs the optional `zstandard` package; zlib is always available.
+#
+# payload_digest() gives the content address used by the deduplicated
+# weather_payload table.
+
+import os
+import zlib
+import hashlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+PAYLOAD_CODEC = os.environ.get('PAYLOAD_CODEC', 'zlib')  # 'zlib' or 'zstd'
+PAYLOAD_DICT_DIR = os.environ.get(
+    'PAYLOAD_DICT_DIR', os.path.join(os.path.abspath(os.path.dirname(__file__)), 'payload_dicts'))
+# Name of the dictionary file (in PAYLOAD_DICT_DIR) used for new writes, if any
+PAYLOAD_DICTIONARY = os.environ.get('PAYLOAD_DICTIONARY', '')
+
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 9
+# zlib only looks back 32 KB, so a bigger preset dictionary is wasted
+ZLIB_MAX_DICT_SIZE = 32 * 1024
+
+_dictionaries = {}
+
+
+def dictionary_id(dictionary):
+    return zlib.crc32(dictionary).to_bytes(4, 'big')
+
+
+def load_dictionary(dict_id):
+    """Returns the dictionary bytes for a 4-byte id, reading PAYLOAD_DICT_DIR once per id."""
+    if dict_id not in _dictionaries:
+        path = os.path.join(PAYLOAD_DICT_DIR, dict_id.hex() + '.dict')
+        with open(path, 'rb') as f:
+            dictionary = f.read()
+        if dictionary_id(dictionary) != dict_id:
+            raise ValueError(f"Payload dictionary {path} does not match its id")
+        _dictionaries[dict_id] = dictionary
+    return _dictionaries[dict_id]
+
+
+def _current_dictionary():
+    if not PAYLOAD_DICTIONARY:
+        return None
+    dict_id = bytes.fromhex(os.path.splitext(PAYLOAD_DICTIONARY)[0])
+    return dict_id, load_dictionary(dict_id)
+
+
+def compress_payload(text, codec=None, dictionary=None):
+    """
+    Compresses a JSON payload string. By default uses PAYLOAD_CODEC and the
+    PAYLOAD_DICTIONARY (if set); pass dictionary=b'' to force no dictionary.
+    """
+    codec = codec or PAYLOAD_CODEC
+    raw = text.encode('utf-8')
+    if dictionary is None:
+        current = _current_dictionary()
+        dictionary = current[1] if current else b''
+
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("PAYLOAD_CODEC=zstd needs the 'zstandard' package")
+        if dictionary:
+            compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL, dict_data=zstandard.ZstdCompressionDict(dictionary))
+            return b'S' + dictionary_id(dictionary) + compressor.compress(raw)
+        return b's' + zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(raw)
+
+    if dictionary:
+        compressor = zlib.compressobj(ZLIB_LEVEL, zdict=dictionary)
+        return b'd' + dictionary_id(dictionary) + compressor.compress(raw) + compressor.flush()
+    return b'z' + zlib.compress(raw, ZLIB_LEVEL)
+
+
+def decompress_payload(blob):
+    """Reverses compress_payload(); accepts bytes or a memoryview (psycopg2 bytea)."""
+    blob = bytes(blob)
+    tag, body = blob[:1], blob[1:]
+    if tag == b'z':
+        raw = zlib.decompress(body)
+    elif tag == b'd':
+        decompressor = zlib.decompressobj(zdict=load_dictionary(body[:4]))
+        raw = decompressor.decompress(body[4:]) + decompressor.flush()
+    elif tag in (b's', b'S'):
+        if zstandard is None:
+            raise RuntimeError("This payload is zstd-compressed; install the 'zstandard' package")
+        if tag == b'S':
+            dict_data = zstandard.ZstdCompressionDict(load_dictionary(body[:4]))
+            raw = zstandard.ZstdDecompressor(dict_data=dict_data).decompress(body[4:])
+        else:
+            raw = zstandard.ZstdDecompressor().decompress(body)
+    else:
+        raise ValueError(f"Unknown payload codec tag {tag!r}")
+    return raw.decode('utf-8')
+
+
+def payload_digest(text):
+    """Content address of a payload: hex SHA-256 of its UTF-8 JSON text."""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def train_dictionary(samples, codec=None, size=16 * 1024):
+    """
+    Builds a shared dictionary from sample payload strings.
+    zstd trains a real dictionary; for zlib the best we can do is a preset
+    window of recent samples (zlib matches against the end of it first).
+    """
+    codec = codec or PAYLOAD_CODEC
+    encoded = [sample.encode('utf-8') for sample in samples]
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("Training a zstd dictionary needs the 'zstandard' package")
+        return zstandard.train_dictionary(size, encoded).as_bytes()
+    return b''.join(encoded)[-min(size, ZLIB_MAX_DICT_SIZE):]
+
+
+def save_dictionary(dictionary):
+    """Writes a dictionary to PAYLOAD_DICT_DIR and returns its file name."""
+    os.makedirs(PAYLOAD_DICT_DIR, exist_ok=True)
+    name = dictionary_id(dictionary).hex() + '.dict'
+    with open(os.path.join(PAYLOAD_DICT_DIR, name), 'wb') as f:
+        f.write(dictionary)
+    return name
@@ -0,0 +1,129 @@
+# rain_model.py
+# "Plan A": the RandomForest trained by train_model.py (plan_a_model.pkl) on
+# features scaled by prepare_data.py's StandardScaler (plan_a_scaler.pkl),
+# applied to OWM forecast blocks.
+#
+# The model was trained on daily station observations, so each OWM block is
+# mapped onto those columns as closely as it allows:
+#   MinTemp / MaxTemp            main.temp_min / main.temp_max (degC)
+#   Humidity9am / Humidity3pm    main.humidity (%)
+#   Pressure9am / Pressure3pm    main.pressure (hPa)
+#   WindSpeed9am / WindSpeed3pm  wind.speed, m/s -> km/h (x 3.6)
+#   RainToday_Num                1 if the block has any rain.3h, else 0
+# The output is the model's probability of rain (its RainTomorrow class).
+#
+# The model is loaded from the memory-mapped plan_a_model.artifact
+# (model_artifact.py) when it exists, which only needs numpy; otherwise from
+# the pickles, which also need scikit-learn and joblib. Without any of them
+# load_rain_model() returns None and callers fall back to OWM's pop.
+
+import os
+
+try:
+    import numpy as np
+    from forest_arrays import export_forest
+    from model_artifact import load_artifact, stale_sources, MANIFEST_NAME
+except ImportError:
+    np = None
+
+try:
+    import joblib
+except ImportError:
+    joblib = None
+
+BACKEND_DIR = os.path.abspath(os.path.dirname(__file__))
+RAIN_MODEL_ARTIFACT = os.environ.get('RAIN_MODEL_ARTIFACT', os.path.join(BACKEND_DIR, 'plan_a_model.artifact'))
+
+# Column order used by prepare_data.py
+FEATURES = ('MinTemp', 'MaxTemp', 'Humidity9am', 'Humidity3pm', 'Pressure9am', 'Pressure3pm',
+            'WindSpeed9am', 'WindSpeed3pm', 'RainToday_Num')
+
+MS_TO_KMH = 3.6
+
+# Evaluate with forest_arrays.FlatForest instead of sklearn. It wins by a
+# wide margin on small batches, but sklearn's compiled tree walk is faster
+# on big ones, so batches above FLAT_FOREST_MAX_ROWS still go to sklearn
+# (see bench_forest.py).
+FLAT_FOREST_ENABLED = os.environ.get('FLAT_FOREST_ENABLED', '1') == '1'
+FLAT_FOREST_MAX_ROWS = int(os.environ.get('FLAT_FOREST_MAX_ROWS', '1000'))
+
+
+def features_from_block(block):
+    """One row of FEATURES from an OWM forecast block."""
+    main = block['main']
+    temp = main.get('temp')
+    humidity = main.get('humidity')
+    pressure = main.get('pressure')
+    wind_kmh = block.get('wind', {}).get('speed', 0) * MS_TO_KMH
+    rain_today = 1.0 if block.get('rain', {}).get('3h', 0) > 0 else 0.0
+    return [main.get('temp_min', temp), main.get('temp_max', temp), humidity, humidity,
+            pressure, pressure, wind_kmh, wind_kmh, rain_today]
+
+
+class RainModel:
+    """
+    The rain model, with a probability-of-rain helper. Built either from the
+    fitted sklearn scaler + classifier pair, or from just a FlatForest (a
+    loaded artifact), which then serves every batch size.
+    """
+
+    def __init__(self, model=None, scaler=None, forest=None):
+        self.model = model
+        self.scaler = scaler
+        self.rain_class = list(model.classes_).index(1) if model is not None else None
+        if forest is None and model is not None and FLAT_FOREST_ENABLED:
+            forest = export_forest(model, scaler)
+        self.forest = forest
+
+    def rain_probabilities(self, blocks):
+        """P(rain) for each OWM block, as a float array."""
+        X = np.array([features_from_block(block) for block in blocks], dtype=np.float64)
+        return self.probabilities_from_features(X)
+
+    def probabilities_from_features(self, X):
+        """P(rain) for each row of raw (unscaled) FEATURES."""
+        if self.forest is not None and (self.model is None or len(X) <= FLAT_FOREST_MAX_ROWS):
+            return self.forest.rain_probabilities(X)
+        # Same arithmetic as scaler.transform(), minus its warning about the
+        # missing column names (the scaler was fitted on a DataFrame)
+        X = (X - self.scaler.mean_) / self.scaler.scale_
+        return self.model.predict_proba(X)[:, self.rain_class]
+
+
+def load_rain_model(model_path=None, scaler_path=None, use_artifact=True):
+    """
+    Loads RAIN_MODEL_ARTIFACT if it exists (and use_artifact and
+    FLAT_FOREST_ENABLED allow it), else plan_a_model.pkl / plan_a_scaler.pkl.
+    An artifact exported from different pickles than the ones on disk is
+    skipped, so a retrained model is never shadowed by a stale export.
+    Returns None if neither can be used.
+    """
+    if np is None:
+        print("numpy not installed: using OWM's pop instead of the rain model")
+        return None
+    model_path = model_path or os.path.join(BACKEND_DIR, 'plan_a_model.pkl')
+    scaler_path = scaler_path or os.path.join(BACKEND_DIR, 'plan_a_scaler.pkl')
+    if use_artifact and FLAT_FOREST_ENABLED and os.path.exists(os.path.join(RAIN_MODEL_ARTIFACT, MANIFEST_NAME)):
+        try:
+            forest, manifest = load_artifact(RAIN_MODEL_ARTIFACT)
+            if manifest["features"] != list(FEATURES):
+                raise ValueError(f"artifact features {manifest['features']} != {list(FEATURES)}")
+            stale = stale_sources(manifest, model_path, scaler_path)
+            if stale:
+                raise ValueError(f"{', '.join(stale)} changed since it was exported; "
+                                 f"re-run model_artifact.py")
+            print(f"Loaded rain model artifact from {RAIN_MODEL_ARTIFACT}")
+            return RainModel(forest=forest)
+        except Exception as e:
+            print(f"Could not load the rain model artifact ({e}): trying the pickles")
+
+    if joblib is None:
+        print("joblib not installed: using OWM's pop instead of the rain model")
+        return None
+    try:
+        rain_model = RainModel(model=joblib.load(model_path), scaler=joblib.load(scaler_path))
+    except Exception as e:
+        print(f"Could not load the rain model ({e}): using OWM's pop instead")
+        return None
+    print(f"Loaded rain model from {model_path}")
+    return rain_model
@@ -0,0 +1,189 @@
+# rollups.py
+# Hourly and daily per-city aggregates of the prediction table, so history
+# questions don't have to scan every raw row (and old raw rows can be pruned).
+#
+# prediction_rollup holds one row per (granularity, bucket, city, intensity_tag)
+# with a row count and the sums of api_pop, api_humidity and
+# api_forecast_amount_mm, each with its count of non-NULL values (what SQL's
+# SUM actually added up), so means can be re-aggregated over any range.
+# rollup_state remembers how far each granularity has been rolled up: every
+# run only aggregates completed buckets after that point. Hours are built from
+# the raw rows, days from the hourly rollups.
+#
+# Run with:  flask --app app rollup   (prune-predictions runs it first too)
+
+import datetime
+from sqlalchemy import (MetaData, Table, Column, String, Text, Integer, Float, DateTime,
+                        select, insert, update, func, literal)
+
+GRANULARITIES = ('hour', 'day')
+
+metadata = MetaData()
+
+prediction_rollup = Table(
+    'prediction_rollup', metadata,
+    Column('granularity', String(8), primary_key=True),
+    Column('bucket_start', DateTime, primary_key=True),
+    Column('city', Text, primary_key=True),
+    Column('intensity_tag', Text, primary_key=True),
+    Column('row_count', Integer, nullable=False),
+    Column('pop_sum', Float),
+    Column('humidity_sum', Float),
+    Column('rain_mm_sum', Float),
+    Column('pop_count', Integer),
+    Column('humidity_count', Integer),
+    Column('rain_mm_count', Integer),
+)
+
+# Columns filled by rollup_hours() / rollup_days(), in select order
+ROLLUP_COLUMNS = ['granularity', 'bucket_start', 'city', 'intensity_tag', 'row_count',
+                  'pop_sum', 'humidity_sum', 'rain_mm_sum', 'pop_count', 'humidity_count', 'rain_mm_count']
+
+rollup_state = Table(
+    'rollup_state', metadata,
+    Column('granularity', String(8), primary_key=True),
+    Column('rolled_up_until', DateTime, nullable=False),
+)
+
+
+def floor_to(moment, granularity):
+    if granularity == 'day':
+        return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def time_bucket(column, granularity, dialect_name):
+    """SQL expression for the start of the hour/day containing a timestamp column."""
+    if dialect_name == 'postgresql':
+        return func.date_trunc(granularity, column)
+    # SQLite keeps DateTime as text; match SQLAlchemy's own format so comparisons work
+    fmt = '%Y-%m-%d 00:00:00.000000' if granularity == 'day' else '%Y-%m-%d %H:00:00.000000'
+    return func.strftime(fmt, column)
+
+
+def get_watermark(conn, granularity):
+    return conn.execute(
+        select(rollup_state.c.rolled_up_until).where(rollup_state.c.granularity == granularity)).scalar()
+
+
+def set_watermark(conn, granularity, moment, previous):
+    if previous is None:
+        conn.execute(insert(rollup_state).values(granularity=granularity, rolled_up_until=moment))
+    else:
+        conn.execute(update(rollup_state).where(rollup_state.c.granularity == granularity)
+                     .values(rolled_up_until=moment))
+
+
+def rollup_hours(conn, prediction, end):
+    """Aggregates raw rows from the 'hour' watermark up to `end` (an hour boundary)."""
+    watermark = get_watermark(conn, 'hour')
+    start = watermark
+    if start is None:
+        first = conn.execute(select(func.min(prediction.c.timestamp))).scalar()
+        if first is None:
+            return 0
+        start = floor_to(first, 'hour')
+    if start >= end:
+        return 0
+
+    bucket = time_bucket(prediction.c.timestamp, 'hour', conn.dialect.name)
+    intensity = func.coalesce(prediction.c.intensity_tag, 'Unknown')
+    aggregates = (
+        select(literal('hour'), bucket, prediction.c.city, intensity, func.count(),
+               func.sum(prediction.c.api_pop), func.sum(prediction.c.api_humidity),
+               func.sum(prediction.c.api_forecast_amount_mm),
+               func.count(prediction.c.api_pop), func.count(prediction.c.api_humidity),
+               func.count(prediction.c.api_forecast_amount_mm))
+        .where(prediction.c.timestamp >= start, prediction.c.timestamp < end)
+        .group_by(bucket, prediction.c.city, intensity))
+    result = conn.execute(insert(prediction_rollup).from_select(ROLLUP_COLUMNS, aggregates))
+    set_watermark(conn, 'hour', end, watermark)
+    return result.rowcount
+
+
+def rollup_days(conn):
+    """Folds completed days of hourly rollups into daily ones."""
+    hour_watermark = get_watermark(conn, 'hour')
+    if hour_watermark is None:
+        return 0
+    end = floor_to(hour_watermark, 'day')
+    watermark = get_watermark(conn, 'day')
+    start = watermark
+    if start is None:
+        first = conn.execute(select(func.min(prediction_rollup.c.bucket_start))
+                             .where(prediction_rollup.c.granularity == 'hour')).scalar()
+        if first is None:
+            return 0
+        start = floor_to(first, 'day')
+    if start >= end:
+        return 0
+
+    hourly = prediction_rollup.alias('hourly')
+    bucket = time_bucket(hourly.c.bucket_start, 'day', conn.dialect.name)
+    aggregates = (
+        select(literal('day'), bucket, hourly.c.city, hourly.c.intensity_tag, func.sum(hourly.c.row_count),
+               func.sum(hourly.c.pop_sum), func.sum(hourly.c.humidity_sum), func.sum(hourly.c.rain_mm_sum),
+               func.sum(hourly.c.pop_count), func.sum(hourly.c.humidity_count), func.sum(hourly.c.rain_mm_count))
+        .where(hourly.c.granularity == 'hour', hourly.c.bucket_start >= start, hourly.c.bucket_start < end)
+        .group_by(bucket, hourly.c.city, hourly.c.intensity_tag))
+    result = conn.execute(insert(prediction_rollup).from_select(ROLLUP_COLUMNS, aggregates))
+    set_watermark(conn, 'day', end, watermark)
+    return result.rowcount
+
+
+def run_rollups(engine, prediction, now=None, lag_seconds=300):
+    """
+    Brings both granularities up to date and returns {granularity: rows added}.
+    Hours are only rolled up once they ended at least lag_seconds ago, so rows
+    still in flight (e.g. in the write-behind queue) land before their hour is
+    aggregated. Each granularity commits together with its watermark.
+    """
+    now = now or datetime.datetime.utcnow()
+    end = floor_to(now - datetime.timedelta(seconds=lag_seconds), 'hour')
+    with engine.begin() as conn:
+        hours = rollup_hours(conn, prediction, end)
+    with engine.begin() as conn:
+        days = rollup_days(conn)
+    return {'hour': hours, 'day': days}
+
+
+def summarize_buckets(rows):
+    """
+    Collapses rollup rows (one per intensity_tag) into one entry per
+    (bucket_start, city): total count, counts per intensity_tag and means.
+    Each mean is over the rows that had that value (None if none did), as in
+    /stats.
+    """
+    summaries = {}
+    for row in rows:
+        key = (row.bucket_start, row.city)
+        if key not in summaries:
+            summaries[key] = {"bucket_start": row.bucket_start.isoformat(), "city": row.city, "count": 0,
+                              "intensity_counts": {}, "pop_sum": 0.0, "humidity_sum": 0.0, "rain_mm_sum": 0.0,
+                              "pop_count": 0, "humidity_count": 0, "rain_mm_count": 0}
+        summary = summaries[key]
+        summary["count"] += row.row_count
+        summary["intensity_counts"][row.intensity_tag] = row.row_count
+        summary["pop_sum"] += row.pop_sum or 0
+        summary["humidity_sum"] += row.humidity_sum or 0
+        summary["rain_mm_sum"] += row.rain_mm_sum or 0
+        summary["pop_count"] += row.pop_count or 0
+        summary["humidity_count"] += row.humidity_count or 0
+        summary["rain_mm_count"] += row.rain_mm_count or 0
+
+    def mean(summary, name):
+        count = summary[f"{name}_count"]
+        return summary[f"{name}_sum"] / count if count else None
+
+    results = []
+    for summary in summaries.values():
+        results.append({
+            "bucket_start": summary["bucket_start"],
+            "city": summary["city"],
+            "count": summary["count"],
+            "intensity_counts": summary["intensity_counts"],
+            "mean_pop": mean(summary, "pop"),
+            "mean_humidity": mean(summary, "humidity"),
+            "mean_rain_mm": mean(summary, "rain_mm"),
+        })
+    return results
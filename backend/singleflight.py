@@ -0,0 +1,97 @@
+# singleflight.py
+# Coalesces concurrent calls for the same key into one in-flight call.
+# Inside a worker, waiting threads share the leader's result. Across gunicorn
+# workers, the leaders take turns on a lock file; the work function is
+# expected to re-check a shared cache first, so later workers find the first
+# worker's result instead of fetching it again.
+# Keys are hashed onto a fixed number of lock-file stripes, so the lock
+# directory never grows past lock_stripes files however many distinct keys
+# clients send. Unrelated keys that share a stripe just take turns.
+
+import os
+import time
+import hashlib
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows: fall back to in-process only
+    fcntl = None
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    single_flight.do(key, fn) runs fn() once per key at a time and hands its
+    result (or exception) to every caller that asked for the same key while
+    it was running.
+    Pass lock_dir to also serialise the same key across processes.
+    """
+
+    def __init__(self, lock_dir=None, wait_seconds=15.0, lock_stripes=256):
+        self.lock_dir = lock_dir if fcntl is not None else None
+        self.wait_seconds = wait_seconds
+        self.lock_stripes = lock_stripes
+        self._lock = threading.Lock()
+        self._calls = {}
+        if self.lock_dir:
+            os.makedirs(self.lock_dir, exist_ok=True)
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not is_leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._run_leader(key, fn)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def _run_leader(self, key, fn):
+        if not self.lock_dir:
+            return fn()
+
+        stripe = int(hashlib.sha1(key.encode('utf-8')).hexdigest(), 16) % self.lock_stripes
+        lock_name = f"stripe-{stripe:03d}.lock"
+        with open(os.path.join(self.lock_dir, lock_name), 'a') as lock_file:
+            locked = self._acquire(lock_file)
+            try:
+                return fn()
+            finally:
+                if locked:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _acquire(self, lock_file):
+        # Poll instead of blocking so a stuck worker can't hold everyone up:
+        # after wait_seconds we give up on the lock and just run fn() ourselves.
+        deadline = time.monotonic() + self.wait_seconds
+        while True:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return True
+            except OSError:
+                if time.monotonic() >= deadline:
+                    print(f"Single-flight lock wait timed out for {lock_file.name}, fetching anyway")
+                    return False
+                time.sleep(0.01)
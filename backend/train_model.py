@@ -27,6 +27,16 @@ print("Model training complete.")
 joblib.dump(model, MODEL_FILE)
 print(f"Successfully saved trained model to '{MODEL_FILE}'")
 
+# The app loads this memory-mappable copy instead of the pickles when it exists
+from forest_arrays import export_forest
+from model_artifact import save_artifact, pickle_source, DEFAULT_ARTIFACT_DIR
+from rain_model import FEATURES
+SCALER_FILE = 'plan_a_scaler.pkl'
+scaler = joblib.load(SCALER_FILE)
+save_artifact(export_forest(model, scaler), FEATURES, scaler, DEFAULT_ARTIFACT_DIR,
+              pickle_source(MODEL_FILE, SCALER_FILE))
+print(f"Successfully exported model artifact to '{DEFAULT_ARTIFACT_DIR}'")
+
 # 3. Evaluate the Model
 print("\n--- Model Evaluation ---")
 print("Making predictions on the test set...")
@@ -0,0 +1,158 @@
+# write_behind.py
+# Optional write-behind path for Prediction inserts: requests put rows on an
+# in-process queue and a background thread writes them in batched
+# transactions, so the user never waits on a commit/fsync.
+#
+# Rows get their primary key up front from IdBlockAllocator, so a response
+# can carry the row's final id before the row reaches the database.
+
+import os
+import queue
+import atexit
+import threading
+from collections import deque
+from sqlalchemy import text
+
+
+class IdBlockAllocator:
+    """
+    Hands out primary keys for a table, reserving them from the database in
+    blocks so only one in every block_size inserts costs a round-trip.
+    Postgres draws from the table's own serial sequence. SQLite has no
+    sequences, so blocks come from a small id_allocator table that never
+    goes below MAX(id) + 1. That only protects reserved blocks from writers
+    that also use it: on SQLite, every process inserting into the table must
+    take its ids from here (app.save_predictions() does, write-behind or not),
+    since a plain autoincrement insert picks MAX(id) + 1 and can land inside
+    another process's unflushed block.
+    """
+
+    def __init__(self, engine, table, block_size=50):
+        self.engine = engine
+        self.table = table
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._ids = deque()
+        self._pid = os.getpid()
+
+    def next_id(self):
+        return self.next_ids(1)[0]
+
+    def next_ids(self, count):
+        """count ids, reserving at most one new block (of at least count ids)."""
+        with self._lock:
+            if self._pid != os.getpid():
+                # A forked child must not reuse the parent's reserved block
+                self._ids.clear()
+                self._pid = os.getpid()
+            if len(self._ids) < count:
+                self._ids.extend(self._reserve_block(max(self.block_size, count - len(self._ids))))
+            return [self._ids.popleft() for _ in range(count)]
+
+    def _reserve_block(self, n):
+        with self.engine.begin() as conn:
+            if self.engine.dialect.name == 'postgresql':
+                rows = conn.execute(
+                    text("SELECT nextval(pg_get_serial_sequence(:table, 'id')) FROM generate_series(1, :n)"),
+                    {"table": self.table, "n": n})
+                return [row[0] for row in rows]
+
+            conn.execute(text(
+                "CREATE TABLE IF NOT EXISTS id_allocator (name TEXT PRIMARY KEY, next_id INTEGER NOT NULL)"))
+            # One statement, so concurrent workers can't reserve the same block
+            end = conn.execute(text(
+                f"INSERT INTO id_allocator (name, next_id) "
+                f"VALUES (:table, COALESCE((SELECT MAX(id) FROM {self.table}), 0) + 1 + :n) "
+                f"ON CONFLICT (name) DO UPDATE SET next_id = "
+                f"MAX(next_id, COALESCE((SELECT MAX(id) FROM {self.table}), 0) + 1) + :n "
+                f"RETURNING next_id"),
+                {"table": self.table, "n": n}).scalar()
+            return list(range(end - n, end))
+
+
+class WriteBehindQueue:
+    """
+    Bounded queue drained by a daemon thread that calls flush_batch(rows) with
+    up to batch_size rows at a time. submit() returns False when the queue is
+    full, so the caller can fall back to a synchronous write.
+    If a batch fails, its rows are retried one by one and the ones that still
+    fail are counted in the 'errors' counter.
+    """
+
+    def __init__(self, flush_batch, max_size=1000, batch_size=100, flush_interval=0.05):
+        self.flush_batch = flush_batch
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_size)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._stopping = False
+        self.counters = {"submitted": 0, "flushed": 0, "batches": 0, "errors": 0, "rejected_full": 0}
+
+    def submit(self, row):
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self.counters["rejected_full"] += 1
+            return False
+        self.counters["submitted"] += 1
+        return True
+
+    def _ensure_started(self):
+        # The flusher thread is per process: start it lazily, and again after a fork
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._stopping = False
+                self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+                self._thread.start()
+                atexit.register(self.stop)
+
+    def _run(self):
+        while True:
+            try:
+                batch = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                if self._stopping:
+                    return
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._flush(batch)
+            for _ in batch:
+                self._queue.task_done()
+
+    def _flush(self, batch):
+        try:
+            self.flush_batch(batch)
+            self.counters["flushed"] += len(batch)
+            self.counters["batches"] += 1
+            return
+        except Exception as e:
+            print(f"Write-behind batch of {len(batch)} failed, retrying row by row: {e}")
+
+        for row in batch:
+            try:
+                self.flush_batch([row])
+                self.counters["flushed"] += 1
+            except Exception as e:
+                self.counters["errors"] += 1
+                print(f"Write-behind row could not be saved: {e}")
+
+    def stop(self, timeout=10.0):
+        """Flushes everything still queued, then stops the thread."""
+        thread = self._thread
+        if thread is None or self._pid != os.getpid() or not thread.is_alive():
+            return
+        self._stopping = True
+        thread.join(timeout)
+        if thread.is_alive():
+            print(f"Write-behind stop timed out with {self._queue.qsize()} rows still queued")
+
+    def stats(self):
+        return dict(self.counters, queued=self._queue.qsize())